@@ -0,0 +1,276 @@
+"""
+跨交易對的持續告警服務
+
+    python alerts.py --symbols-file ../coin_list.json --period 180天 --interval 1m --sink file:alerts.jsonl
+
+每根 interval K線收盤時，以一次 /ticker/price 取得所有交易對的最新價格，
+對「交易對 × 規則」矩陣做向量化判斷：
+  - 波動率狀態：與 app.py 側邊欄相同的 σ 區間（🟢 正常 / 🟡 偏高 / 🔴 極高），狀態改變時告警
+  - 價位穿越：價格穿越 KDE 阻力（峰值）或支撐（谷值）位時告警
+各交易對的基準（報酬率均值 / 標準差、KDE 價位）只在所選時間範圍的K線收盤後重算，且每輪限量刷新。
+告警經去重（同一鍵在冷卻期內只發一次）與全局限流後交給可替換的 sink。
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+import requests
+
+from market_data import TIME_OPTIONS, INTERVAL_MS, fetch_all_prices
+from analysis import MAX_RESISTANCE, MAX_SUPPORT, VOLATILITY_LEVELS, volatility_level_codes
+from kline_cache import KlineCache, load_klines, load_derived
+
+logger = logging.getLogger(__name__)
+
+LEVEL_EMOJI = {'normal': '🟢', 'elevated': '🟡', 'extreme': '🔴'}
+
+
+# === Sinks ===
+class PrintSink:
+    """輸出到標準輸出"""
+
+    def send(self, alerts):
+        for alert in alerts:
+            print(alert['message'])
+
+
+class FileSink:
+    """以 JSON Lines 追加寫入本地文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookSink:
+    """把一批告警 POST 到 webhook（本地測試伺服器或聊天機器人）"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        requests.post(self.url, json={'alerts': alerts}, timeout=self.timeout)
+
+
+def make_sink(spec):
+    """由 'print'、'file:路徑' 或 'webhook:URL' 建立 sink"""
+    if spec == 'print':
+        return PrintSink()
+    kind, _, target = spec.partition(':')
+    if kind == 'file':
+        return FileSink(target)
+    if kind == 'webhook':
+        return WebhookSink(target)
+    raise ValueError(f"未知的 sink: {spec}")
+
+
+# === 去重與限流 ===
+class AlertThrottle:
+    """
+    同一 key 在 cooldown 秒內只放行一次；全局以令牌桶限制每分鐘最多 per_minute 則
+    被丟棄的告警數記在 dropped
+    """
+
+    def __init__(self, cooldown=1800, per_minute=60):
+        self.cooldown = cooldown
+        self.per_minute = per_minute
+        self._last_sent = {}
+        self._tokens = float(per_minute)
+        self._refilled_at = None
+        self.dropped = 0
+
+    def filter(self, alerts, now):
+        if self._refilled_at is not None:
+            self._tokens = min(self.per_minute, self._tokens + (now - self._refilled_at) * self.per_minute / 60)
+        self._refilled_at = now
+
+        passed = []
+        for alert in alerts:
+            key = alert['key']
+            if now - self._last_sent.get(key, -np.inf) < self.cooldown:
+                continue
+            if self._tokens < 1:
+                self.dropped += 1
+                continue
+            self._tokens -= 1
+            self._last_sent[key] = now
+            passed.append(alert)
+        return passed
+
+
+# === 告警引擎 ===
+class AlertEngine:
+    """
+    維護所有交易對的基準矩陣並在每次收盤時一次性判斷
+    基準陣列（長度 N）：reference（計算最新報酬率的前一期價格）、mean、std、refresh_at
+    價位矩陣（N × K）：levels 與對應的 level_kinds（1 阻力、-1 支撐），不足處為 NaN
+    """
+
+    def __init__(self, symbols, period="180天", sinks=(), throttle=None,
+                 max_refresh_per_tick=50, cache=None):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.period = period
+        self.interval, self.limit = TIME_OPTIONS[period]
+        self.sinks = list(sinks)
+        self.throttle = throttle or AlertThrottle()
+        self.max_refresh_per_tick = max_refresh_per_tick
+        # 獨立的緩存：不影響 app 的熱門交易對統計
+        self.cache = cache or KlineCache(max_age=24 * 3600)
+
+        n, k = len(self.symbols), MAX_RESISTANCE + MAX_SUPPORT
+        self.reference = np.full(n, np.nan)
+        self.mean = np.full(n, np.nan)
+        self.std = np.full(n, np.nan)
+        self.refresh_at = np.zeros(n)
+        self.levels = np.full((n, k), np.nan)
+        self.level_kinds = np.zeros((n, k), dtype=np.int8)
+        self.last_price = np.full(n, np.nan)
+        self.last_state = np.full(n, -2, dtype=np.int8)  # -2 尚未判斷
+
+    def refresh_baselines(self, now, limit=None):
+        """重算已過期的交易對基準（每輪最多 limit 個，預設 max_refresh_per_tick，最舊的優先）"""
+        due = np.flatnonzero(self.refresh_at <= now)
+        due = due[np.argsort(self.refresh_at[due])][:limit or self.max_refresh_per_tick]
+        for i in due:
+            symbol = self.symbols[i]
+            try:
+                entry = load_klines(symbol, self.interval, self.limit, cache=self.cache, record=False)
+                derived = load_derived(symbol, self.interval, self.limit, entry, cache=self.cache)
+            except Exception as e:
+                logger.warning("更新 %s 基準失敗: %s", symbol, e)
+                self.refresh_at[i] = now + 300
+                continue
+            vol = derived['volatility']
+            last_close = entry['df']['close'].iloc[-1]
+            # 最新報酬率 = 價格 / reference - 1，reference 即上一期收盤
+            self.reference[i] = last_close / (1 + vol['latest'])
+            self.mean[i] = vol['mean']
+            self.std[i] = vol['std']
+            self.levels[i] = np.nan
+            self.level_kinds[i] = 0
+            dist = derived['distribution']
+            if dist is not None:
+                peaks = dist['x_vals'][dist['peaks'][:MAX_RESISTANCE]]
+                troughs = dist['x_vals'][dist['troughs'][:MAX_SUPPORT]]
+                values = np.concatenate([peaks, troughs])
+                self.levels[i, :len(values)] = values
+                self.level_kinds[i, :len(values)] = [1] * len(peaks) + [-1] * len(troughs)
+            self.refresh_at[i] = entry['expires_at']
+        return len(due)
+
+    def evaluate(self, prices, now):
+        """
+        prices: 長度 N 的最新價格（缺失為 NaN）
+        返回本輪產生的告警（尚未去重限流）
+        """
+        alerts = []
+        timestamp = int(now * 1000)
+
+        # 波動率狀態（向量化 σ 區間判斷），僅在狀態改變時告警
+        # 基準已過期、尚未輪到刷新的交易對略過：其 reference 仍是上上期收盤，報酬率跨了兩期
+        latest = prices / self.reference - 1
+        state = volatility_level_codes(latest, self.mean, self.std)
+        valid = np.isfinite(latest) & np.isfinite(self.std) & (self.refresh_at > now)
+        changed = valid & (state >= 0) & (state != self.last_state) & (self.last_state != -2)
+        for i in np.flatnonzero(changed):
+            level = VOLATILITY_LEVELS[state[i]]
+            alerts.append({
+                'key': f"{self.symbols[i]}:volatility:{level}",
+                'time': timestamp,
+                'symbol': self.symbols[i],
+                'type': 'volatility',
+                'level': level,
+                'latest': float(latest[i]),
+                'mean': float(self.mean[i]),
+                'std': float(self.std[i]),
+                'message': f"{LEVEL_EMOJI[level]} {self.symbols[i]} 波動率 {latest[i]:.2%} "
+                           f"(均值 {self.mean[i]:.2%}, σ {self.std[i]:.2%})",
+            })
+        self.last_state = np.where(valid & (state >= 0), state, self.last_state).astype(np.int8)
+
+        # 價位穿越：上一輪價格與本輪價格分處價位兩側
+        prev = self.last_price[:, None]
+        curr = prices[:, None]
+        up = (prev < self.levels) & (curr >= self.levels)
+        down = (prev > self.levels) & (curr <= self.levels)
+        for i, j in zip(*np.nonzero(up | down)):
+            direction = "向上" if up[i, j] else "向下"
+            kind = "阻力" if self.level_kinds[i, j] > 0 else "支撐"
+            level = self.levels[i, j]
+            alerts.append({
+                'key': f"{self.symbols[i]}:level:{level:.6g}:{'up' if up[i, j] else 'down'}",
+                'time': timestamp,
+                'symbol': self.symbols[i],
+                'type': 'level_cross',
+                'level_kind': 'resistance' if self.level_kinds[i, j] > 0 else 'support',
+                'level': float(level),
+                'price': float(prices[i]),
+                'direction': 'up' if up[i, j] else 'down',
+                'message': f"📍 {self.symbols[i]} {direction}穿越{kind} ${level:.6f} (現價 ${prices[i]:.6f})",
+            })
+        self.last_price = np.where(np.isfinite(prices), prices, self.last_price)
+        return alerts
+
+    def tick(self, now=None, all_prices=None):
+        """完整一輪：更新基準 -> 取價 -> 判斷 -> 去重限流 -> 發送"""
+        now = time.time() if now is None else now
+        self.refresh_baselines(now)
+        if all_prices is None:
+            all_prices = fetch_all_prices()
+        prices = np.array([all_prices.get(s, np.nan) for s in self.symbols])
+        alerts = self.throttle.filter(self.evaluate(prices, now), now)
+        if alerts:
+            for sink in self.sinks:
+                try:
+                    sink.send(alerts)
+                except Exception as e:
+                    logger.warning("告警發送失敗 (%s): %s", type(sink).__name__, e)
+        return alerts
+
+    def run(self, interval="1m", delay=1.0):
+        """在每根 interval K線收盤後 delay 秒執行一輪"""
+        step = INTERVAL_MS[interval] / 1000
+        self.refresh_baselines(time.time(), limit=len(self.symbols))
+        while True:
+            now = time.time()
+            time.sleep(step - now % step + delay)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning("本輪告警判斷失敗: %s", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="波動率與價位穿越告警服務")
+    parser.add_argument("--symbols", help="以逗號分隔的交易對（未指定時讀取 --symbols-file）")
+    parser.add_argument("--symbols-file", default="coin_list.json")
+    parser.add_argument("--period", default="180天", choices=list(TIME_OPTIONS))
+    parser.add_argument("--interval", default="1m", help="判斷頻率（K線週期）")
+    parser.add_argument("--sink", action="append", default=None,
+                        help="print / file:路徑 / webhook:URL，可重複指定")
+    parser.add_argument("--cooldown", type=int, default=1800, help="同一告警的冷卻秒數")
+    parser.add_argument("--per-minute", type=int, default=60, help="每分鐘最多告警數")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+    else:
+        with open(args.symbols_file, 'r') as file:
+            symbols = [item['symbol'] for item in json.load(file)]
+    engine = AlertEngine(
+        symbols,
+        period=args.period,
+        sinks=[make_sink(spec) for spec in (args.sink or ['print'])],
+        throttle=AlertThrottle(cooldown=args.cooldown, per_minute=args.per_minute),
+    )
+    print(f"監控 {len(engine.symbols)} 個交易對，時間範圍 {args.period}，每 {args.interval} 判斷一次")
+    engine.run(args.interval)
@@ -0,0 +1,160 @@
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+
+from kernels import candle_volume_profile, local_extrema, scott_bandwidth, weighted_kde
+
+# 價格分布與波動率分析（不依賴 streamlit，供 app.py 與背景工作共用）
+
+# 粗週期的一根K線涵蓋很寬的價格區間，成交量全部放在收盤價會失真：
+# 這些週期改為把成交量分攤到 low–high 區間（見 kernels.candle_volume_profile）
+INTRACANDLE_MODEL = {'3d': 'triangular', '1w': 'triangular'}
+# 分攤後的分布以此寬度（網格點數）輕度平滑，消除各K線區間端點造成的階梯
+PROFILE_SMOOTHING = 5
+# 圖表、告警、API 與回測共用的支撐 / 阻力位數量：最多 5 個阻力位（峰值）、3 個支撐位（谷值）
+MAX_RESISTANCE = 5
+MAX_SUPPORT = 3
+
+
+def distribution_model(interval):
+    """該K線週期的價格分布模型：None 為收盤價 KDE，否則為K線內分布模型"""
+    return INTRACANDLE_MODEL.get(interval)
+
+
+def price_distribution(df, grid_size=1000, order=20, model=None):
+    """
+    成交量加權的收盤價 KDE；model 為 'uniform' / 'triangular' 時改為K線內成交量分布
+    返回 dict(x_vals, kde_vals, peaks, troughs)，有效數據點不足時返回 None
+    peaks 為峰值（阻力位）索引，troughs 為谷值（支撐位）索引
+    """
+    if model is not None:
+        return intracandle_distribution(df, grid_size, order, model)
+
+    # 直接在 numpy 陣列上篩選，移除缺失價格與零成交量的數據點
+    close = df['close'].to_numpy()
+    volume = df['volume'].to_numpy()
+    valid_mask = ~np.isnan(close) & (volume > 0)
+
+    if valid_mask.sum() <= 10:  # 確保有足夠的數據點
+        return None
+
+    # 使用成交量作為權重的 KDE（與 gaussian_kde 相同的 Scott 頻寬）
+    points = close[valid_mask].astype(np.float64)
+    weights = volume[valid_mask].astype(np.float64)
+    weights /= weights.sum()
+    x_vals = np.linspace(points.min(), points.max(), grid_size)
+    kde_vals = weighted_kde(points, weights, x_vals, scott_bandwidth(points, weights))
+
+    # 尋找峰值和谷值
+    peaks, troughs = local_extrema(kde_vals, order)
+    return {
+        'x_vals': x_vals,
+        'kde_vals': kde_vals,
+        'peaks': peaks,
+        'troughs': troughs,
+    }
+
+
+def intracandle_distribution(df, grid_size=1000, order=20, model='triangular'):
+    """
+    每根K線的成交量按 model 分攤到其 low–high 區間後的價格分布（網格涵蓋最低價至最高價）
+    返回格式同 price_distribution，kde_vals 正規化為密度
+    """
+    close = df['close'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    valid_mask = ~np.isnan(close) & (volume > 0)
+    if valid_mask.sum() <= 10:
+        return None
+
+    # low / high 缺失時退化為收盤價
+    low = np.fmin(df['low'].to_numpy(dtype=np.float64)[valid_mask], close[valid_mask])
+    high = np.fmax(df['high'].to_numpy(dtype=np.float64)[valid_mask], close[valid_mask])
+    x_vals = np.linspace(low.min(), high.max(), grid_size)
+    profile = candle_volume_profile(low, high, close[valid_mask], volume[valid_mask], x_vals, model)
+    profile = gaussian_filter1d(profile, PROFILE_SMOOTHING, mode='constant')
+    step = x_vals[1] - x_vals[0]
+    total = profile.sum() * step
+    kde_vals = profile / total if total > 0 else profile
+
+    peaks, troughs = local_extrema(kde_vals, order)
+    return {
+        'x_vals': x_vals,
+        'kde_vals': kde_vals,
+        'peaks': peaks,
+        'troughs': troughs,
+    }
+
+
+def volatility_returns(df, interval):
+    """
+    根據K線週期計算歷史波動率分佈
+    返回 (volatility_data, period_name)
+    """
+    if interval == "1d":
+        # 日線數據直接計算日報酬率
+        volatility_data = df['close'].pct_change().dropna()
+        period_name = "日"
+    elif interval in ["3d", "1w"]:
+        # 3日線和週線數據，直接使用週期報酬率
+        volatility_data = df['close'].pct_change().dropna()
+        period_name = "3日" if interval == "3d" else "週"
+    else:
+        # 小時線與分鐘線，重新採樣到日線計算日波動率
+        daily_df = df['close'].resample('1D').last()
+        volatility_data = daily_df.pct_change().dropna()
+        period_name = "日"
+    return volatility_data, period_name
+
+
+def volatility_stats(volatility_data):
+    """波動率均值、標準差與最新值"""
+    return {
+        'mean': volatility_data.mean(),
+        'std': volatility_data.std(),
+        'latest': volatility_data.iloc[-1] if not volatility_data.empty else 0,
+    }
+
+
+def volatility_level(latest, mean, std):
+    """
+    依 σ 區間判斷波動率狀態
+    返回 'normal' (±1σ 內)、'elevated' (1σ~2σ)、'extreme' (2σ 以外)，剛好落在邊界時返回 None
+    """
+    if mean - std < latest < mean + std:
+        return 'normal'
+    if mean + std < latest < mean + 2 * std or mean - 2 * std < latest < mean - std:
+        return 'elevated'
+    if latest > mean + 2 * std or latest < mean - 2 * std:
+        return 'extreme'
+    return None
+
+
+# volatility_level_codes 的代碼對應的狀態（-1 為恰落在邊界）
+VOLATILITY_LEVELS = ('normal', 'elevated', 'extreme')
+
+
+def volatility_level_codes(latest, mean, std):
+    """
+    volatility_level 的向量化版本（可一次判斷多個交易對）
+    返回 0 正常、1 偏高、2 極高、-1 恰落在邊界
+    """
+    latest, mean, std = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (latest, mean, std)))
+    normal = (mean - std < latest) & (latest < mean + std)
+    elevated = ((mean + std < latest) & (latest < mean + 2 * std)) | ((mean - 2 * std < latest) & (latest < mean - std))
+    extreme = (latest > mean + 2 * std) | (latest < mean - 2 * std)
+    return np.select([normal, elevated, extreme], [0, 1, 2], default=-1)
+
+
+def summarize(df, interval, distribution=None):
+    """
+    計算一組K線的全部衍生統計（價格分布 + 波動率）
+    distribution 為已算好的價格分布（例如來自靜態快照）時不重新計算 KDE
+    """
+    volatility_data, period_name = volatility_returns(df, interval)
+    stats = volatility_stats(volatility_data)
+    return {
+        'distribution': price_distribution(df, model=distribution_model(interval)) if distribution is None else distribution,
+        'volatility_data': volatility_data,
+        'period_name': period_name,
+        'volatility': stats,
+        'level': volatility_level(stats['latest'], stats['mean'], stats['std']),
+    }
@@ -0,0 +1,251 @@
+"""
+分析結果 HTTP API（與 app.py 共用同一套抓取、緩存與分析代碼）
+
+    python api_server.py --port 8080
+
+GET /stats/{symbol}?period=180天     波動率統計與價格預測區間
+GET /levels/{symbol}?period=180天    KDE 阻力 / 支撐位（curve=1 時附帶密度曲線）
+GET /scan?period=180天&symbols=A,B   多個交易對的統計摘要（未指定時使用熱門交易對）
+
+預設返回精簡 JSON；?format=arrow 或 Accept: application/vnd.apache.arrow.stream 時返回 Arrow IPC（需安裝 pyarrow）
+ETag 由最後一根K線時間與數據抓取時間組成，客戶端帶 If-None-Match 可獲得 304
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import threading
+
+from aiohttp import web
+
+from market_data import TIME_OPTIONS
+from analysis import MAX_RESISTANCE, MAX_SUPPORT
+from kline_cache import KLINE_CACHE, load_klines, load_derived
+from prefetch import DEFAULT_SYMBOLS, start_prefetch_worker
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow 輸出為可選功能
+    pa = None
+
+DEFAULT_PERIOD = "180天"
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+MAX_SCAN_SYMBOLS = 200
+
+
+class ResponseCache:
+    """已序列化響應的緩存：(路徑, 參數, 格式) -> (etag, body)"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, etag):
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+        return None
+
+    def put(self, key, etag, body):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (etag, body)
+
+
+def entry_etag(symbol, interval, limit, entry):
+    df = entry['df']
+    last_candle = int(df['open_time'].iloc[-1]) if len(df) else 0
+    return f'"{symbol}-{interval}-{limit}-{last_candle}-{int(entry["fetched_at"] * 1000)}"'
+
+
+def stats_payload(symbol, period, entry, derived):
+    df = entry['df']
+    vol = derived['volatility']
+    price = float(df['close'].iloc[-1])
+    std = float(vol['std'])
+    return {
+        'symbol': symbol,
+        'period': period,
+        'last_candle_time': int(df['open_time'].iloc[-1]),
+        'price': price,
+        'period_name': derived['period_name'],
+        'mean': float(vol['mean']),
+        'std': std,
+        'latest': float(vol['latest']),
+        'level': derived['level'],
+        'band_68': [price * (1 - std), price * (1 + std)],
+        'band_95': [price * (1 - 2 * std), price * (1 + 2 * std)],
+    }
+
+
+def levels_payload(symbol, period, entry, derived, curve=False):
+    dist = derived['distribution']
+    payload = {
+        'symbol': symbol,
+        'period': period,
+        'last_candle_time': int(entry['df']['open_time'].iloc[-1]),
+        'resistance': [],
+        'support': [],
+    }
+    if dist is None:
+        return payload
+    x_vals, kde_vals = dist['x_vals'], dist['kde_vals']
+    payload['resistance'] = [float(x_vals[p]) for p in dist['peaks'][:MAX_RESISTANCE]]
+    payload['support'] = [float(x_vals[t]) for t in dist['troughs'][:MAX_SUPPORT]]
+    if curve:
+        payload['curve'] = {'x': x_vals.tolist(), 'density': kde_vals.tolist()}
+    return payload
+
+
+def finite(value):
+    """遞迴把 NaN / ±inf 轉為 None（嚴格 JSON 不允許非有限數）"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite(v) for v in value]
+    return value
+
+
+def to_json(payload):
+    return json.dumps(finite(payload), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def to_arrow(rows):
+    """將 dict 列表轉換為 Arrow IPC stream"""
+    table = pa.Table.from_pylist(rows)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_rows(kind, payload):
+    """把各端點的 JSON 結構攤平成表格行"""
+    if kind == 'scan':
+        return [{k: v for k, v in row.items() if not isinstance(v, list)} for row in payload['results']]
+    if kind == 'levels':
+        rows = [{'symbol': payload['symbol'], 'kind': 'resistance', 'price': p} for p in payload['resistance']]
+        rows += [{'symbol': payload['symbol'], 'kind': 'support', 'price': p} for p in payload['support']]
+        return rows
+    return [{k: v for k, v in payload.items() if not isinstance(v, list)}]
+
+
+def wants_arrow(request):
+    fmt = request.query.get('format')
+    if fmt:
+        return fmt == 'arrow'
+    return ARROW_MIME in request.headers.get('Accept', '')
+
+
+def resolve_period(request):
+    period = request.query.get('period', DEFAULT_PERIOD)
+    if period not in TIME_OPTIONS:
+        raise web.HTTPBadRequest(text=f"未知的時間範圍: {period}，可選: {', '.join(TIME_OPTIONS)}")
+    return period
+
+
+def load_symbol(symbol, period):
+    """同步載入（在線程池中執行）：返回 (etag, entry, derived)"""
+    interval, limit = TIME_OPTIONS[period]
+    entry = load_klines(symbol, interval, limit)
+    derived = load_derived(symbol, interval, limit, entry)
+    return entry_etag(symbol, interval, limit, entry), entry, derived
+
+
+class AnalyticsAPI:
+    def __init__(self, response_cache=None):
+        self.response_cache = response_cache or ResponseCache()
+
+    async def _load(self, symbol, period):
+        loop = asyncio.get_running_loop()
+        try:
+            loaded = await loop.run_in_executor(None, load_symbol, symbol, period)
+        except Exception as e:
+            raise web.HTTPBadGateway(text=f"獲取 {symbol} 數據失敗: {e}")
+        if loaded[1]['df'].empty:
+            raise web.HTTPNotFound(text=f"{symbol} 在 {period} 內沒有K線數據")
+        return loaded
+
+    def _respond(self, request, kind, etag, build):
+        """處理 If-None-Match 與響應緩存，build() 只在緩存未命中時調用"""
+        arrow = wants_arrow(request)
+        if arrow:
+            if pa is None:
+                raise web.HTTPNotAcceptable(text="伺服器未安裝 pyarrow，無法輸出 Arrow")
+            etag = etag[:-1] + '-arrow"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+
+        key = (request.path, request.query_string, arrow)
+        body = self.response_cache.get(key, etag)
+        if body is None:
+            payload = build()
+            body = to_arrow(arrow_rows(kind, payload)) if arrow else to_json(payload)
+            self.response_cache.put(key, etag, body)
+        content_type = ARROW_MIME if arrow else 'application/json'
+        return web.Response(body=body, headers={'ETag': etag, 'Content-Type': content_type})
+
+    async def stats(self, request):
+        symbol = request.match_info['symbol'].upper()
+        period = resolve_period(request)
+        etag, entry, derived = await self._load(symbol, period)
+        return self._respond(request, 'stats', etag,
+                             lambda: stats_payload(symbol, period, entry, derived))
+
+    async def levels(self, request):
+        symbol = request.match_info['symbol'].upper()
+        period = resolve_period(request)
+        curve = request.query.get('curve') in ('1', 'true')
+        etag, entry, derived = await self._load(symbol, period)
+        return self._respond(request, 'levels', etag,
+                             lambda: levels_payload(symbol, period, entry, derived, curve))
+
+    async def scan(self, request):
+        period = resolve_period(request)
+        if request.query.get('symbols'):
+            symbols = [s.strip().upper() for s in request.query['symbols'].split(',') if s.strip()]
+        else:
+            symbols = list(DEFAULT_SYMBOLS) + [s for s in KLINE_CACHE.top_symbols(50) if s not in DEFAULT_SYMBOLS]
+        symbols = list(dict.fromkeys(symbols))[:MAX_SCAN_SYMBOLS]
+
+        results = await asyncio.gather(*(self._load(s, period) for s in symbols), return_exceptions=True)
+        loaded = [(s, r) for s, r in zip(symbols, results) if not isinstance(r, Exception)]
+        failed = [s for s, r in zip(symbols, results) if isinstance(r, Exception)]
+        digest = hashlib.sha1("".join(r[0] for _, r in loaded).encode('utf-8')).hexdigest()[:16]
+        etag = f'"scan-{period}-{digest}"'
+
+        def build():
+            return {
+                'period': period,
+                'results': [stats_payload(s, period, entry, derived) for s, (_, entry, derived) in loaded],
+                'failed': failed,
+            }
+        return self._respond(request, 'scan', etag, build)
+
+
+def create_app(prefetch=True):
+    api = AnalyticsAPI()
+    app = web.Application()
+    app.add_routes([
+        web.get('/stats/{symbol}', api.stats),
+        web.get('/levels/{symbol}', api.levels),
+        web.get('/scan', api.scan),
+    ])
+    if prefetch:
+        start_prefetch_worker()
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="加密貨幣分析 API 伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--no-prefetch", action="store_true", help="不啟動背景預取")
+    args = parser.parse_args()
+    web.run_app(create_app(prefetch=not args.no_prefetch), host=args.host, port=args.port)
@@ -1,14 +1,22 @@
 import requests
 import pandas as pd
-import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
-from scipy.stats import norm, gaussian_kde
-from scipy.signal import argrelextrema
 from datetime import datetime, timedelta
 import json
 import time
+from market_data import BINANCE_API, TIME_OPTIONS, REQUEST_COALESCER, get_json, fetch_current_price, fetch_closes
+from analysis import MAX_RESISTANCE, MAX_SUPPORT, summarize
+from kernels import percentile_rank
+from kline_cache import KLINE_CACHE, load_klines, load_derived
+from prefetch import start_prefetch_worker
+from correlation import align_closes, analyze_correlation
+from simulation import simulate_log_paths, price_bands
+from figures import data_fingerprint, price_distribution_figure, volatility_figure, candlestick_figure, volume_figure, depth_heatmap_figure, volume_at_price_figure
+from orderbook import DEPTH_HEATMAPS, refresh_heatmap
+from volume_profile import PageBudgetExceeded, uncached_days, volume_at_price
+from snapshots import SNAPSHOTS, fetch_klines_snapshot, snapshot_derived
 
 st.set_page_config(layout="wide")
 #st.title("📊 加密貨幣價格波動與價值分布分析工具 (Binance API)")
@@ -16,12 +24,15 @@ st.set_page_config(layout="wide")
 
 st.sidebar.header("選擇參數")
 
+# 背景預取熱門交易對（每個進程只啟動一次）
+start_prefetch_worker()
+
 # 獲取 Binance 交易對清單
 @st.cache_data(ttl=3600)  # 緩存1小時
 def get_binance_symbols():
     """獲取 Binance 所有 USDT 交易對"""
     try:
-        url = "https://api.binance.com/api/v3/exchangeInfo"
+        url = f"{BINANCE_API}/exchangeInfo"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
         }
@@ -59,51 +70,43 @@ def get_binance_klines(symbol, interval, limit=1000):
     interval: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d, 3d, 1w, 1M
     """
     try:
-        url = "https://api.binance.com/api/v3/klines"
-        params = {
-            'symbol': symbol,
-            'interval': interval,
-            'limit': limit
-        }
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if isinstance(data, list):
-            # 轉換為 DataFrame
-            df = pd.DataFrame(data, columns=[
-                'open_time', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
-            
-            # 數據類型轉換
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col])
-            
-            # 時間戳轉換
-            df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
-            df.set_index('datetime', inplace=True)
-            return df
-        else:
-            st.error(f"API 返回錯誤: {data}")
-            return None
-            
+        # 有靜態快照時（瀏覽器版）先載入快照，只請求之後的K線
+        if SNAPSHOTS is not None:
+            return load_klines(symbol, interval, limit, fetch=fetch_klines_snapshot)['df']
+        return load_klines(symbol, interval, limit)['df']
     except Exception as e:
         st.error(f"❌ 獲取數據失敗: {e}")
         return None
 
+# 獲取衍生統計（價格分布 + 波動率），優先使用背景預取的結果
+def get_derived_stats(symbol, interval, limit, df):
+    """獲取衍生統計"""
+    entry = KLINE_CACHE.peek(symbol, interval, limit)
+    if entry is not None and entry['df'] is df:
+        if entry['derived'] is None and SNAPSHOTS is not None:
+            derived = snapshot_derived(symbol, interval, limit, df)
+            if derived is not None:
+                KLINE_CACHE.set_derived(symbol, interval, limit, df, derived)
+                return derived
+        return load_derived(symbol, interval, limit, entry)
+    return summarize(df, interval)
+
+# 區塊自助法模擬（同一組報酬率與期數只模擬一次；與價格無關，換算到當前價格在緩存之外進行）
+@st.cache_data(ttl=600, max_entries=32)  # 緩存10分鐘，限量（不在 CRYMAP_CACHE_MB 預算內，見 kline_cache.py）
+def get_price_simulation(returns, horizon):
+    """模擬未來的累積對數報酬率分布"""
+    return simulate_log_paths(returns, horizon=horizon, seed=0)
+
 # 獲取當前價格
 def get_current_price(symbol):
     """獲取當前價格"""
-    try:
-        url = "https://api.binance.com/api/v3/ticker/price"
-        params = {'symbol': symbol}
-        response = requests.get(url, params=params)
-        data = response.json()
-        return float(data['price'])
-    except:
-        return None
+    return fetch_current_price(symbol)
+
+# 獲取多個交易對的收盤價（相關性分析用）
+@st.cache_data(ttl=600, max_entries=16)  # 緩存10分鐘，限量
+def get_close_matrix(symbols, interval, limit):
+    """獲取並對齊多個交易對的收盤價"""
+    return align_closes(fetch_closes(symbols, interval, limit))
 
 # 載入交易對
 symbols_data = get_binance_symbols()
@@ -128,19 +131,7 @@ selected_symbol_key = st.sidebar.selectbox(
 selected_symbol = symbol_options[selected_symbol_key]
 
 # 時間範圍選擇
-time_options = {
-    "1天": ("3m", 480),
-    "3天": ("15m", 288), 
-    "7天": ("15m", 672),
-    "14天": ("1h", 336),
-    "30天": ("4h", 180),
-    "90天": ("6h", 360),
-    "180天": ("1d", 180),
-    "1年": ("1d", 365),
-    "2年": ("1d", 730),
-    "3年": ("3d", 365),
-    "5年": ("1w", 260),
-}
+time_options = TIME_OPTIONS
 
 selected_period = st.sidebar.selectbox(
     "選擇時間範圍", 
@@ -160,80 +151,21 @@ if df is None:
     st.error("❌ 無法獲取數據，請檢查網絡連接或稍後再試")
     st.stop()
 
+derived = get_derived_stats(selected_symbol, interval, limit, df)
+# 圖表緩存鍵：同一份數據的圖表在所有 session 間共用
+figure_key = (selected_symbol, interval, limit) + data_fingerprint(df)
+
 # === 價格分布圖（成交量加權 KDE） ===
 st.subheader("📊 價格分布圖 (成交量加權)")
 
 prices = df['close'].dropna()
-volumes = df['volume'].loc[prices.index]
-
-# 移除零成交量的數據點
-valid_mask = volumes > 0
-prices_clean = prices[valid_mask]
-volumes_clean = volumes[valid_mask]
+distribution = derived['distribution']
 
-if len(prices_clean) > 10:  # 確保有足夠的數據點
+if distribution is not None:  # 確保有足夠的數據點
     try:
-        # 使用成交量作為權重的 KDE
-        kde = gaussian_kde(prices_clean, weights=volumes_clean/volumes_clean.sum())
-        x_vals = np.linspace(prices_clean.min(), prices_clean.max(), 1000)
-        kde_vals = kde(x_vals)
-        
-        # 尋找峰值和谷值
-        peaks = argrelextrema(kde_vals, np.greater, order=20)[0]
-        troughs = argrelextrema(kde_vals, np.less, order=20)[0]
-        
-        fig2 = go.Figure()
-        
-        # KDE 曲線
-        fig2.add_trace(go.Scatter(
-            x=x_vals, y=kde_vals, 
-            fill='tozeroy', 
-            mode='lines',
-            line_color='orange', 
-            name='價格密度分布',
-            fillcolor='rgba(255,165,0,0.3)'
-        ))
-        
-        # 當前價格線
+        # 成交量加權 KDE 及其峰值、谷值（支撐阻力位）
         current_display_price = current_price if current_price else prices.iloc[-1]
-        fig2.add_vline(
-            x=current_display_price, 
-            line_dash="dash", 
-            line_color="white", 
-            line_width=3,
-            annotation_text=f"當前價格: ${current_display_price:.6f}", 
-            annotation_position="bottom right"
-        )
-        
-        # 標記重要價格水平（峰值 - 支撐阻力位）
-        for i, p in enumerate(peaks[:5]):  # 最多顯示5個峰值
-            price_level = x_vals[p]
-            fig2.add_vline(x=price_level, line_dash="dot", line_color="blue", line_width=1)
-            fig2.add_annotation(
-                x=price_level, y=kde_vals[p]*1.1, 
-                text=f"阻力: ${price_level:.6f}", 
-                showarrow=True, arrowhead=1,
-                arrowcolor="blue", font=dict(size=10)
-            )
-        
-        # 標記支撐位（谷值）
-        for i, t in enumerate(troughs[:3]):  # 最多顯示3個谷值
-            price_level = x_vals[t]
-            fig2.add_vline(x=price_level, line_dash="dot", line_color="gray", line_width=1)
-            fig2.add_annotation(
-                x=price_level, y=kde_vals[t]*0.5, 
-                text=f"支撐: ${price_level:.6f}", 
-                showarrow=True, arrowhead=1,
-                arrowcolor="gray", font=dict(size=10)
-            )
-        
-        fig2.update_layout(
-            height=500, 
-            margin=dict(l=20, r=20, t=30, b=20),
-            xaxis_title="價格 (USDT)", 
-            yaxis_title="加權密度",
-            template="plotly_white"
-        )
+        fig2 = price_distribution_figure(figure_key, distribution, current_display_price)
         
         st.plotly_chart(fig2, use_container_width=True)
         
@@ -255,14 +187,12 @@ def calculate_today_volatility(symbol):
     """計算當日波動率 - 固定使用最近24小時數據"""
     try:
         # 獲取最近24小時的小時線數據
-        url = "https://api.binance.com/api/v3/klines"
         params = {
             'symbol': symbol,
             'interval': '1h',
             'limit': 25  # 25小時確保有24小時完整數據
         }
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        data = get_json("klines", params)
         
         if isinstance(data, list) and len(data) >= 2:
             # 取24小時前和現在的價格
@@ -276,84 +206,23 @@ def calculate_today_volatility(symbol):
         return 0
 
 # 計算歷史波動率分佈（根據選定的時間範圍）
-if interval == "1d":
-    # 日線數據直接計算日報酬率
-    df['daily_return'] = df['close'].pct_change()
-    volatility_data = df['daily_return'].dropna()
-    period_name = "日"
-elif interval in ["1h", "4h", "6h"]:
-    # 小時線數據，重新採樣到日線計算日波動率
-    daily_df = df['close'].resample('1D').last()
-    daily_returns = daily_df.pct_change().dropna()
-    volatility_data = daily_returns
-    period_name = "日"
-elif interval in ["3d", "1w"]:
-    # 3日線和週線數據，直接使用週期報酬率
-    volatility_data = df['close'].pct_change().dropna()
-    if interval == "3d":
-        period_name = "3日"
-    else:
-        period_name = "週"
-else:
-    # 其他時間框架（分鐘線），重新採樣到日線
-    daily_df = df['close'].resample('1D').last()
-    daily_returns = daily_df.pct_change().dropna()
-    volatility_data = daily_returns
-    period_name = "日" 
+volatility_data = derived['volatility_data']
+period_name = derived['period_name']
 
 # 固定計算當日24小時波動率（不受時間範圍影響）
 today_vol = calculate_today_volatility(selected_symbol)
 
-mean_vol = volatility_data.mean()
-std_vol = volatility_data.std()
-latest_vol = volatility_data.iloc[-1] if not volatility_data.empty else 0
+mean_vol = derived['volatility']['mean']
+std_vol = derived['volatility']['std']
+latest_vol = derived['volatility']['latest']
 
 # 計算當日波動率在分佈中的百分位數
-if len(volatility_data) > 0:
-    today_percentile = (volatility_data <= today_vol).sum() / len(volatility_data) * 100
-else:
-    today_percentile = 50
+today_percentile = float(percentile_rank(volatility_data.to_numpy(), today_vol))
 
 # === 互動式波動分布圖 ===
 st.subheader(f"📈 {period_name}波動分布圖")
 
-x = np.linspace(volatility_data.min(), volatility_data.max(), 500)
-y = norm.pdf(x, mean_vol, std_vol)
-
-fig1 = go.Figure()
-
-
-# 添加正態分布線
-fig1.add_trace(go.Scatter(
-    x=x, y=y, 
-    mode='lines', 
-    name='常態分布', 
-    line=dict(color='red', width=2)
-))
-
-# 添加統計線
-fig1.add_vline(x=mean_vol, line_dash="dash", line_color="blue", 
-               annotation_text="均值", annotation_position="bottom left")
-fig1.add_vline(x=mean_vol + std_vol, line_dash="dash", line_color="green", 
-               annotation_text="+1σ", annotation_position="bottom left")
-fig1.add_vline(x=mean_vol - std_vol, line_dash="dash", line_color="green", 
-               annotation_text="-1σ", annotation_position="bottom left")
-fig1.add_vline(x=mean_vol + 2*std_vol, line_dash="dash", line_color="red", 
-               annotation_text="+2σ", annotation_position="bottom left")
-fig1.add_vline(x=mean_vol - 2*std_vol, line_dash="dash", line_color="red", 
-               annotation_text="-2σ", annotation_position="bottom left")
-fig1.add_vline(x=latest_vol, line_dash="dot", line_color="orange", line_width=3,
-               annotation_text=f"最新: {latest_vol:.2%}", annotation_position="top right")
-
-fig1.update_layout(
-    height=500, 
-    margin=dict(l=20, r=20, t=30, b=20),
-    xaxis_title=f"{period_name}波動率 (%)", 
-    yaxis_title="密度",
-    template="plotly_white",
-    showlegend=True
-)
-
+fig1 = volatility_figure(figure_key, volatility_data, mean_vol, std_vol, latest_vol, period_name)
 st.plotly_chart(fig1, use_container_width=True)
 
 
@@ -378,52 +247,173 @@ with col2:
     st.markdown(f"- 68%信賴區間: ${current_display_price * (1 - std_vol):.6f}$ ~ ${current_display_price * (1 + std_vol):.6f}$")
     st.markdown(f"- 95%信賴區間: ${current_display_price * (1 - 2*std_vol):.6f}$ ~ ${current_display_price * (1 + 2*std_vol):.6f}$")
 
+# === 自助法模擬價格區間 ===
+sim_horizon = st.slider(f"模擬期數 ({period_name})", min_value=1, max_value=30, value=5)
+sim_levels = []
+sim_labels = []
+if distribution is not None:
+    for p in distribution['peaks'][:MAX_RESISTANCE]:
+        sim_levels.append(float(distribution['x_vals'][p]))
+        sim_labels.append("阻力")
+    for t in distribution['troughs'][:MAX_SUPPORT]:
+        sim_levels.append(float(distribution['x_vals'][t]))
+        sim_labels.append("支撐")
+
+log_simulation = get_price_simulation(volatility_data.to_numpy(), sim_horizon)
+simulation = price_bands(log_simulation, float(current_display_price), sim_levels) if log_simulation is not None else None
+if simulation is not None:
+    col5, col6 = st.columns(2)
+    bands = simulation['terminal_quantiles']
+    with col5:
+        st.markdown(f"**區塊自助法模擬 ({simulation['n_paths']:,} 條路徑, {sim_horizon} {period_name})**")
+        st.markdown(f"- 68%區間: ${bands[1]:.6f}$ ~ ${bands[3]:.6f}$")
+        st.markdown(f"- 95%區間: ${bands[0]:.6f}$ ~ ${bands[4]:.6f}$")
+        st.markdown(f"- 中位數: ${bands[2]:.6f}$")
+        st.markdown(f"- 期末上漲機率: {simulation['prob_up']:.1%}")
+    with col6:
+        if sim_levels:
+            st.markdown("**價位觸及機率**")
+            st.dataframe(pd.DataFrame({
+                '類型': sim_labels,
+                '價位': simulation['levels'],
+                '觸及機率': [f"{p:.1%}" for p in simulation['hit_prob']],
+            }), use_container_width=True, hide_index=True)
+
 # === 價格趨勢圖 ===
 st.subheader("📈 價格趨勢圖")
 
-fig3 = go.Figure()
-
-fig3.add_trace(go.Candlestick(
-    x=df.index,
-    open=df['open'],
-    high=df['high'],
-    low=df['low'],
-    close=df['close'],
-    name='價格'
-))
-
-fig3.update_layout(
-    height=400,
-    xaxis_title="時間",
-    yaxis_title="價格 (USDT)",
-    template="plotly_white",
-    xaxis_rangeslider_visible=False
-)
-
+fig3 = candlestick_figure(figure_key, df)
 st.plotly_chart(fig3, use_container_width=True)
 
 # === 成交量圖 ===
 st.subheader("📊 成交量趨勢")
 
-fig4 = go.Figure()
-
-fig4.add_trace(go.Bar(
-    x=df.index,
-    y=df['volume'],
-    name='成交量',
-    marker_color='lightblue'
-))
+fig4 = volume_figure(figure_key, df)
+st.plotly_chart(fig4, use_container_width=True)
 
-fig4.update_layout(
-    height=300,
-    xaxis_title="時間",
-    yaxis_title="成交量",
-    template="plotly_white"
-)
+st.sidebar.markdown("---")
+show_depth = st.sidebar.checkbox("顯示訂單簿深度熱圖", value=False)
+show_trade_profile = st.sidebar.checkbox("顯示逐筆成交價量分布", value=False)
+show_correlation = st.sidebar.checkbox("顯示跨幣種相關性", value=False)
+
+# === 訂單簿深度熱圖 ===
+if show_depth and distribution is not None:
+    st.subheader("🧱 訂單簿深度熱圖")
+    # 與價格分布圖相同的價格網格；同一交易對的熱圖在所有 session 間共用
+    heatmap = DEPTH_HEATMAPS.get(selected_symbol, distribution['x_vals'])
+    try:
+        # 有串流時由背景更新；無串流（例如瀏覽器環境）或串流停滯時，每次 rerun 以 REST 快照更新
+        if DEPTH_HEATMAPS.ensure_stream(selected_symbol, heatmap) is None or heatmap.stale():
+            refresh_heatmap(selected_symbol, heatmap)
+    except Exception as e:
+        st.warning(f"無法獲取訂單簿: {e}")
+    if heatmap.count:
+        fig7 = depth_heatmap_figure(selected_symbol, heatmap, current_display_price)
+        st.plotly_chart(fig7, use_container_width=True)
+        st.caption(f"{heatmap.count} 個快照，每 {heatmap.min_interval:.0f} 秒取樣一次")
+
+# === 逐筆成交價量分布 (aggTrades) ===
+# 只合併已緩存的日與當日（當日從上次的進度接續），其餘已結束的日需先以 volume_profile.py 建立緩存；
+# 每次重新執行最多發出此數量的請求
+AGG_TRADES_PAGE_BUDGET = 200
+
+if show_trade_profile and distribution is not None:
+    st.subheader("🧮 逐筆成交價量分布")
+    try:
+        with st.spinner("正在統計逐筆成交..."):
+            trade_profile = volume_at_price(selected_symbol, int(df['open_time'].iloc[0]),
+                                            max_pages=AGG_TRADES_PAGE_BUDGET, cached_only=True)
+    except PageBudgetExceeded as e:
+        trade_profile = None
+        st.info(f"{e}。可先以 volume_profile.py 從 API 或存檔建立緩存。")
+    except Exception as e:
+        trade_profile = None
+        st.error(f"❌ 獲取逐筆成交失敗: {e}")
+    if trade_profile is not None:
+        buy_vals, sell_vals = trade_profile.to_grid(distribution['x_vals'])
+        profile_key = figure_key + (trade_profile.trades,)
+        fig8 = volume_at_price_figure(profile_key, distribution['x_vals'], buy_vals, sell_vals, current_display_price)
+        st.plotly_chart(fig8, use_container_width=True)
+        total_volume = buy_vals.sum() + sell_vals.sum()
+        if total_volume > 0:
+            st.caption(f"{trade_profile.trades:,} 筆成交，主動買入佔 {buy_vals.sum() / total_volume:.1%}"
+                       "（以 UTC 日為單位統計）")
+        missing = len(uncached_days(selected_symbol, int(df['open_time'].iloc[0])))
+        if missing:
+            st.caption(f"另有 {missing} 個已結束的 UTC 日尚未緩存，未計入；可以 volume_profile.py 從 API 或存檔建立。")
+
+# === 跨幣種相關性分析 ===
+
+if show_correlation:
+    st.subheader("🔗 跨幣種相關性")
+
+    default_corr_symbols = [s for s in ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT", "ADAUSDT"]
+                            if s in symbol_options.values()]
+    if selected_symbol not in default_corr_symbols:
+        default_corr_symbols.append(selected_symbol)
+    corr_symbols = st.multiselect(
+        "選擇交易對",
+        sorted(symbol_options.values()),
+        default=default_corr_symbols
+    )
+    corr_window = st.slider("滾動相關窗口 (K線數)", min_value=10, max_value=200, value=30, step=5)
+
+    if len(corr_symbols) < 2:
+        st.info("請至少選擇兩個交易對")
+    else:
+        with st.spinner("正在獲取多幣種數據..."):
+            close_df = get_close_matrix(tuple(sorted(corr_symbols)), interval, limit)
 
-st.plotly_chart(fig4, use_container_width=True)
+        if close_df.shape[1] < 2:
+            st.error("❌ 可用的交易對數據不足")
+        else:
+            corr_result = analyze_correlation(close_df, benchmark="BTCUSDT", window=corr_window)
+            corr_df = corr_result['corr']
+
+            fig5 = px.imshow(
+                corr_df,
+                color_continuous_scale="RdBu_r",
+                zmin=-1, zmax=1,
+                aspect="auto",
+                labels=dict(color="相關係數")
+            )
+            fig5.update_layout(
+                height=max(400, 18 * len(corr_df)),
+                margin=dict(l=20, r=20, t=30, b=20),
+                template="plotly_white"
+            )
+            st.plotly_chart(fig5, use_container_width=True)
+
+            if corr_result['beta'] is not None:
+                col3, col4 = st.columns(2)
+                with col3:
+                    st.markdown("**相對 BTCUSDT 的 Beta 與聚類**")
+                    st.dataframe(pd.DataFrame({
+                        'Beta': corr_result['beta'],
+                        '聚類': corr_result['clusters'],
+                    }).loc[corr_df.index], use_container_width=True)
+                with col4:
+                    st.markdown(f"**與 BTCUSDT 的滾動相關 ({corr_window} 根K線)**")
+                    rolling_df = corr_result['rolling'].drop(columns="BTCUSDT")
+                    fig6 = go.Figure()
+                    for sym in rolling_df.columns:
+                        fig6.add_trace(go.Scatter(x=rolling_df.index, y=rolling_df[sym], mode='lines', name=sym))
+                    fig6.update_layout(
+                        height=400,
+                        yaxis_title="相關係數",
+                        yaxis_range=[-1, 1],
+                        template="plotly_white"
+                    )
+                    st.plotly_chart(fig6, use_container_width=True)
+            else:
+                st.info("加入 BTCUSDT 以計算 Beta 與滾動相關")
 
 st.sidebar.markdown(f"**更新時間**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+request_stats = REQUEST_COALESCER.stats()
+st.sidebar.caption(f"API 請求: 實際 {request_stats['executed']} 次 / 合併 {request_stats['coalesced']} 次")
+cache_stats = KLINE_CACHE.stats()
+st.sidebar.caption(f"K線緩存: {cache_stats['entries']} 項 / {cache_stats['bytes'] / 2 ** 20:.1f} MB"
+                   f"（淘汰 {cache_stats['evictions']} 次）")
 
 # 添加數據源信息
 st.sidebar.markdown("---")
@@ -434,11 +424,12 @@ if current_price:
 else:
     st.sidebar.markdown(f" **最新價格**: ${df['close'].iloc[-1]:.6f}")
 st.sidebar.markdown(f"#### 當前波動率: {latest_vol:.2%} ({today_percentile:.2f} 百分位)")
-if latest_vol > mean_vol - std_vol and latest_vol < mean_vol + std_vol:
+volatility_state = derived['level']
+if volatility_state == 'normal':
     st.sidebar.markdown("**🟢 當前波動率正常**")
-elif (latest_vol > mean_vol + std_vol and latest_vol < mean_vol + 2 * std_vol) or (latest_vol < mean_vol - std_vol and latest_vol > mean_vol - 2 * std_vol):
+elif volatility_state == 'elevated':
     st.sidebar.markdown("**🟡 當前波動率高於平均一個標準差**")
-elif latest_vol > mean_vol + 2 * std_vol or latest_vol < mean_vol - 2 * std_vol:
+elif volatility_state == 'extreme':
     st.sidebar.markdown("**🔴 當前波動率極高**")
 # === 風險提示 ===
 st.sidebar.markdown("---")
@@ -0,0 +1,100 @@
+"""
+匯入 Binance 公開數據存檔 (data.binance.vision) 的K線 zip 到本地列式存檔
+
+    python archive_import.py ./downloads --store ./data/klines --processes 8
+
+會遞迴搜尋目錄下形如 BTCUSDT-1m-2023-01.zip（月檔）或 BTCUSDT-1m-2023-01-05.zip（日檔）的文件，
+各文件在進程池中以串流方式分塊解壓、解析 CSV，按時間順序逐個文件寫入存檔（與既有數據以 open_time 去重，
+只寫入新的片段），記憶體中同時只有進程池正在處理的幾個文件。
+之後設定 CRYMAP_KLINE_STORE 即可讓 app / API 讀取存檔。
+"""
+import argparse
+import os
+import re
+import time
+import zipfile
+from collections import defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from market_data import KLINE_COLUMNS
+from kline_store import STORE_COLUMNS, KlineStore, empty_columns
+
+ARCHIVE_NAME = re.compile(r'^(?P<symbol>[A-Z0-9]+)-(?P<interval>\d+[smhdwM])-\d{4}-\d{2}(-\d{2})?\.zip$')
+CHUNK_ROWS = 200_000
+# 2025 年起的現貨存檔時間戳為微秒
+MICROSECOND_THRESHOLD = 10 ** 14
+
+
+def find_archives(directory):
+    """返回 {(symbol, interval): [zip 路徑...]}"""
+    groups = defaultdict(list)
+    for root, _, files in os.walk(directory):
+        for name in files:
+            match = ARCHIVE_NAME.match(name)
+            if match:
+                groups[(match['symbol'], match['interval'])].append(os.path.join(root, name))
+    return {key: sorted(paths) for key, paths in groups.items()}
+
+
+def decode_archive(path, chunk_rows=CHUNK_ROWS):
+    """串流解壓並分塊解析一個 zip 中的 CSV，返回該文件的欄位字典"""
+    parts = defaultdict(list)
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if not member.endswith('.csv'):
+                continue
+            with zf.open(member) as stream:
+                # 部分存檔帶有表頭
+                has_header = not stream.peek(1)[:1].isdigit()
+                reader = pd.read_csv(stream, header=None, names=KLINE_COLUMNS, usecols=list(STORE_COLUMNS),
+                                     skiprows=1 if has_header else 0, chunksize=chunk_rows)
+                for chunk in reader:
+                    for col, dtype in STORE_COLUMNS.items():
+                        parts[col].append(chunk[col].to_numpy(dtype=dtype))
+    if not parts:
+        return empty_columns()
+    columns = {col: np.concatenate(parts[col]) for col in STORE_COLUMNS}
+    for col in ('open_time', 'close_time'):
+        micro = columns[col] >= MICROSECOND_THRESHOLD
+        columns[col][micro] //= 1000
+    return columns
+
+
+def _decode_task(task):
+    symbol, interval, path = task
+    return symbol, interval, decode_archive(path)
+
+
+def import_archives(directory, store, processes=None):
+    """
+    匯入目錄中的所有存檔
+    返回 {(symbol, interval): (文件數, 新增行數, 總行數)}
+    """
+    groups = find_archives(directory)
+    tasks = [(symbol, interval, path) for (symbol, interval), paths in sorted(groups.items()) for path in paths]
+    summary = {}
+    with Pool(processes) as pool:
+        # 按順序取回解析結果，每個文件到達後立即寫入（月檔按時間排序，通常只是追加新片段）
+        for symbol, interval, columns in pool.imap(_decode_task, tasks):
+            added, total = store.write(symbol, interval, columns)
+            files, prev_added, _ = summary.get((symbol, interval), (0, 0, 0))
+            summary[(symbol, interval)] = (files + 1, prev_added + added, total)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯入 Binance 公開K線存檔")
+    parser.add_argument("directory", help="存放 zip 文件的目錄")
+    parser.add_argument("--store", default=os.environ.get('CRYMAP_KLINE_STORE', 'data/klines'),
+                        help="本地存檔目錄（預設為 CRYMAP_KLINE_STORE 或 data/klines）")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    summary = import_archives(args.directory, KlineStore(args.store), args.processes)
+    for (symbol, interval), (files, added, total) in sorted(summary.items()):
+        print(f"{symbol} {interval}: {files} 個文件, 新增 {added} 行, 共 {total} 行")
+    print(f"匯入完成, 耗時 {time.time() - t0:.1f} 秒")
@@ -0,0 +1,222 @@
+"""
+KDE 支撐 / 阻力位的滾動 (walk-forward) 回測
+
+    python backtest.py --symbols BTCUSDT,ETHUSDT --interval 1h --days 365 --window 336 --step 6
+
+在每個歷史評估點，僅用往前 window 根K線重算成交量加權 KDE 的峰值（阻力）與谷值（支撐），
+再觀察之後 horizon 根K線內價格是否觸及該價位，以及觸及後 reaction 根K線的反應（反轉 / 突破）。
+同時對窗口內均勻隨機抽取的價位做相同統計，作為比較基準。
+
+與 analysis.price_distribution 逐點調用 gaussian_kde 不同，這裡使用固定的全局價格網格：
+窗口滑動時只把進出窗口的K線以線性分箱加入 / 移出成交量直方圖，
+再以 FFT 做高斯平滑（頻寬同樣依 Scott 規則計算），每個評估點的成本與窗口長度無關。
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis import MAX_RESISTANCE, MAX_SUPPORT
+from kline_store import load_history
+from kernels import local_extrema, scott_bandwidth
+
+
+class RollingVolumeProfile:
+    """固定價格網格上的滑動窗口成交量直方圖，支持增量加入 / 移除K線"""
+
+    def __init__(self, lo, hi, n_bins=4096):
+        self.lo = lo
+        self.n_bins = n_bins
+        self.dx = (hi - lo) / (n_bins - 1) if hi > lo else 1.0
+        self.centers = lo + np.arange(n_bins) * self.dx
+        self.hist = np.zeros(n_bins)
+        self._fft_size = 1 << int(np.ceil(np.log2(2 * n_bins)))
+        self._freqs = np.fft.rfftfreq(self._fft_size)
+
+    def add(self, prices, volumes, sign=1.0):
+        """以線性分箱把成交量分配到相鄰兩個網格點（sign=-1 時移除）"""
+        if len(prices) == 0:
+            return
+        pos = np.clip((prices - self.lo) / self.dx, 0, self.n_bins - 1)
+        idx = np.minimum(pos.astype(np.int64), self.n_bins - 2)
+        frac = pos - idx
+        self.hist += sign * np.bincount(idx, weights=volumes * (1 - frac), minlength=self.n_bins)
+        self.hist += sign * np.bincount(idx + 1, weights=volumes * frac, minlength=self.n_bins)
+        if sign < 0:
+            # 浮點加減的殘差
+            np.maximum(self.hist, 0, out=self.hist)
+
+    def density(self, bandwidth):
+        """高斯平滑後的密度（網格上），高斯核的傅立葉變換為解析形式，不需逐點計算"""
+        total = self.hist.sum()
+        if total <= 0:
+            return np.zeros(self.n_bins)
+        sigma = bandwidth / self.dx
+        spectrum = np.fft.rfft(self.hist, self._fft_size)
+        spectrum *= np.exp(-2 * (np.pi * sigma * self._freqs) ** 2)
+        smoothed = np.fft.irfft(spectrum, self._fft_size)[:self.n_bins]
+        return np.maximum(smoothed, 0) / (total * self.dx)
+
+
+def window_levels(profile, prices, volumes, grid_size=1000, order=20, max_peaks=MAX_RESISTANCE, max_troughs=MAX_SUPPORT):
+    """
+    由當前直方圖求窗口的阻力位（峰值）與支撐位（谷值）
+    與 app.py 相同：在窗口價格範圍內取 grid_size 個點，左右各 order 個鄰點比較
+    """
+    x_vals = np.linspace(prices.min(), prices.max(), grid_size)
+    bandwidth = scott_bandwidth(prices, volumes)
+    if not np.isfinite(bandwidth) or bandwidth <= 0:
+        return np.empty(0), np.empty(0)
+    kde_vals = np.interp(x_vals, profile.centers, profile.density(bandwidth))
+    peaks, troughs = local_extrema(kde_vals, order)
+    return x_vals[peaks[:max_peaks]], x_vals[troughs[:max_troughs]]
+
+
+def level_reactions(levels, price, high, low, close, reaction, tolerance):
+    """
+    評估一組價位在未來K線上的表現
+    返回 (touched, bars_to_touch, outcome)，outcome: 1 反轉、-1 突破、0 無明顯方向
+    """
+    k, h = len(levels), len(high)
+    if k == 0 or h == 0:
+        return np.zeros(k, bool), np.full(k, -1), np.zeros(k, int)
+    lv = levels[:, None]
+    hit = (low[None, :] <= lv) & (high[None, :] >= lv)
+    touched = hit.any(axis=1)
+    first = np.where(touched, hit.argmax(axis=1), -1)
+
+    # 價位在當前價格之上時，反轉代表觸及後收盤回落到價位下方，反之亦然
+    side = np.sign(levels - price)
+    after = close[np.clip(first + reaction, 0, h - 1)]
+    move = side * (levels - after) / levels
+    outcome = np.where(move > tolerance, 1, np.where(move < -tolerance, -1, 0))
+    outcome = np.where(touched, outcome, 0)
+    return touched, first, outcome
+
+
+def walk_forward(open_time, close, high, low, volume, window=336, step=1, horizon=48,
+                 reaction=6, tolerance=0.002, n_bins=4096, seed=0):
+    """
+    單一交易對的滾動回測
+    返回 DataFrame：每個評估點、每個價位一行（kind: resistance / support / random）
+    """
+    n = len(close)
+    valid = np.isfinite(close) & (volume > 0)
+    if valid.sum() <= 10 or n <= window:
+        return pd.DataFrame()
+    price_fill = np.where(valid, close, close[valid][0])
+    weight = np.where(valid, volume, 0.0)
+
+    profile = RollingVolumeProfile(price_fill.min(), price_fill.max(), n_bins)
+    rng = np.random.default_rng(seed)
+    records = {k: [] for k in ('open_time', 'kind', 'level', 'price', 'distance', 'touched', 'bars_to_touch', 'outcome')}
+    added = removed = 0
+
+    for t in range(window - 1, n - 1, step):
+        start = t - window + 1
+        # 增量更新：只處理進入與離開窗口的K線
+        profile.add(price_fill[added:t + 1], weight[added:t + 1])
+        profile.add(price_fill[removed:start], weight[removed:start], sign=-1.0)
+        added, removed = t + 1, start
+
+        w_valid = valid[start:t + 1]
+        if w_valid.sum() <= 10:  # 與 app.py 相同的最少數據點
+            continue
+        w_prices = close[start:t + 1][w_valid]
+        w_volumes = volume[start:t + 1][w_valid]
+        resistance, support = window_levels(profile, w_prices, w_volumes)
+        baseline = rng.uniform(w_prices.min(), w_prices.max(), len(resistance) + len(support))
+
+        end = min(n, t + 1 + horizon)
+        price = close[t]
+        levels = np.concatenate([resistance, support, baseline])
+        touched, first, outcome = level_reactions(levels, price, high[t + 1:end], low[t + 1:end],
+                                                  close[t + 1:end], reaction, tolerance)
+        records['open_time'].extend([open_time[t]] * len(levels))
+        records['kind'].extend(['resistance'] * len(resistance) + ['support'] * len(support) + ['random'] * len(baseline))
+        records['level'].extend(levels)
+        records['price'].extend([price] * len(levels))
+        records['distance'].extend((levels - price) / price)
+        records['touched'].extend(touched)
+        records['bars_to_touch'].extend(first)
+        records['outcome'].extend(outcome)
+
+    result = pd.DataFrame(records)
+    result['datetime'] = pd.to_datetime(result['open_time'], unit='ms')
+    return result
+
+
+def _backtest_job(args):
+    symbol, arrays, params = args
+    result = walk_forward(*arrays, **params)
+    result.insert(0, 'symbol', symbol)
+    return result
+
+
+def run_backtest(frames, processes=None, **params):
+    """
+    對多個交易對並行回測
+    frames: {symbol: K線 DataFrame}；params 傳給 walk_forward
+    """
+    jobs = [
+        (symbol, (df['open_time'].to_numpy(np.int64), df['close'].to_numpy(np.float64),
+                  df['high'].to_numpy(np.float64), df['low'].to_numpy(np.float64),
+                  df['volume'].to_numpy(np.float64)), params)
+        for symbol, df in frames.items()
+    ]
+    if processes == 1 or len(jobs) <= 1:
+        results = [_backtest_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_backtest_job, jobs))
+    results = [r for r in results if not r.empty]
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def summarize_backtest(result):
+    """依價位類型彙總觸及率、反轉率與突破率（後兩者以觸及次數為分母）"""
+    if result.empty:
+        return pd.DataFrame()
+    touched = result[result['touched']]
+    summary = pd.DataFrame({
+        'levels': result.groupby('kind').size(),
+        'touch_rate': result.groupby('kind')['touched'].mean(),
+        'rejection_rate': touched.groupby('kind')['outcome'].apply(lambda s: (s == 1).mean()),
+        'breakout_rate': touched.groupby('kind')['outcome'].apply(lambda s: (s == -1).mean()),
+        'mean_bars_to_touch': touched.groupby('kind')['bars_to_touch'].mean(),
+    })
+    return summary.reindex(['resistance', 'support', 'random']).dropna(how='all')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KDE 支撐 / 阻力位滾動回測")
+    parser.add_argument("--symbols", default="BTCUSDT,ETHUSDT", help="以逗號分隔的交易對")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--window", type=int, default=336, help="計算 KDE 的回看K線數")
+    parser.add_argument("--step", type=int, default=1, help="每隔幾根K線評估一次")
+    parser.add_argument("--horizon", type=int, default=48, help="觀察是否觸及的未來K線數")
+    parser.add_argument("--reaction", type=int, default=6, help="觸及後判斷反應的K線數")
+    parser.add_argument("--tolerance", type=float, default=0.002, help="反轉 / 突破的最小幅度")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", help="輸出逐價位明細 CSV")
+    args = parser.parse_args()
+
+    end_ms = int(time.time() * 1000)
+    start_ms = end_ms - args.days * 24 * 3600 * 1000
+    frames = {}
+    for symbol in [s.strip().upper() for s in args.symbols.split(',') if s.strip()]:
+        try:
+            frames[symbol] = load_history(symbol, args.interval, start_ms, end_ms)
+        except Exception as e:
+            print(f"❌ 獲取 {symbol} 數據失敗: {e}")
+
+    t0 = time.time()
+    result = run_backtest(frames, processes=args.processes, window=args.window, step=args.step,
+                          horizon=args.horizon, reaction=args.reaction, tolerance=args.tolerance)
+    print(f"回測完成: {len(frames)} 個交易對, {len(result)} 個價位, 耗時 {time.time() - t0:.1f} 秒")
+    print(summarize_backtest(result).to_string())
+    if args.output:
+        result.to_csv(args.output, index=False)
@@ -0,0 +1,101 @@
+"""
+為瀏覽器版 (gh-pages) 預先計算靜態快照
+
+    python build_snapshots.py --coin-list ../coin_list.json --out snapshots
+    # 只重建部分交易對（其餘分片與 manifest 中的記錄保留）
+    python build_snapshots.py --symbols BTCUSDT ETHUSDT
+
+每個交易對按K線週期各請求一次（各時間範圍共用同一週期最長的K線），
+計算每個時間範圍的價格分布後寫出 {symbol}.npz 分片，最後更新 manifest.json。
+分片格式與讀取見 snapshots.py；npm run deploy 前會自動執行（predeploy），
+並由 .github/workflows/snapshots.yml 每 6 小時重建後重新部署。
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from market_data import fetch_klines
+from snapshots import MANIFEST_NAME, SNAPSHOT_VERSION, build_shard, snapshot_intervals
+
+logger = logging.getLogger(__name__)
+
+
+def build_symbol(symbol, out_dir):
+    """抓取K線並寫出一個交易對的分片，返回分片大小（位元組）"""
+    frames = {interval: fetch_klines(symbol, interval, limit)
+              for interval, limit in snapshot_intervals().items()}
+    data = build_shard(frames)
+    path = os.path.join(out_dir, f"{symbol}.npz")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as file:
+        file.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get('version') == SNAPSHOT_VERSION else {}
+
+
+def build_snapshots(symbols, out_dir, workers=4):
+    """建置多個交易對的分片並更新 manifest，返回 (成功數, 失敗的交易對, 總大小)"""
+    os.makedirs(out_dir, exist_ok=True)
+    built = {}
+    failed = []
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_symbol, symbol, out_dir): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                total_bytes += future.result()
+                built[symbol] = int(time.time() * 1000)
+            except Exception as e:
+                logger.warning("%s 快照建置失敗: %s", symbol, e)
+                failed.append(symbol)
+
+    # 失敗的交易對保留上次的分片與記錄
+    manifest = load_manifest(out_dir)
+    entries = {symbol: built_at for symbol, built_at in manifest.get('symbols', {}).items()
+               if os.path.exists(os.path.join(out_dir, f"{symbol}.npz"))}
+    entries.update(built)
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'built_at': int(time.time() * 1000),
+        'symbols': dict(sorted(entries.items())),
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as file:
+        json.dump(manifest, file, separators=(',', ':'))
+    return len(built), failed, total_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="預先計算瀏覽器版的靜態快照")
+    parser.add_argument("--coin-list", default="../coin_list.json", help="交易對清單 (get_symbol_lists.py 的輸出)")
+    parser.add_argument("--symbols", nargs='+', help="只建置這些交易對（預設為清單中的全部）")
+    parser.add_argument("--out", default="snapshots", help="輸出目錄（部署時隨 src 一併發佈）")
+    parser.add_argument("--workers", type=int, default=4, help="併發交易對數（注意 Binance 的請求權重限制）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.symbols:
+        symbols = [s.upper() for s in args.symbols]
+    else:
+        with open(args.coin_list, 'r') as file:
+            symbols = [item['symbol'] for item in json.load(file)]
+    t0 = time.time()
+    count, failed, total_bytes = build_snapshots(symbols, args.out, workers=args.workers)
+    print(f"建置 {count} / {len(symbols)} 個交易對，共 {total_bytes / 2 ** 20:.1f} MB，"
+          f"耗時 {time.time() - t0:.1f} 秒")
+    if failed:
+        print(f"失敗: {', '.join(sorted(failed))}")
+    if symbols and not count:
+        raise SystemExit(1)
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from market_data import INTERVAL_MS, REQUEST_COALESCER
+from kline_store import KLINE_STORE, STORE_COLUMNS, columns_to_dataframe, dataframe_to_columns
+
+# CoinGecko 行情數據來源（供 web.py 使用）
+# 與 Binance 路徑共用 kline_store / kline_cache 的介面：交易對鍵為 "coingecko/{coin id}"，
+# fetch_coingecko_stored(symbol, interval, limit) 可直接作為 load_klines 的 fetch 參數
+# market_chart 的粒度由天數決定：1 天內為 5 分鐘，90 天內為 1 小時，更長為 1 天
+
+COINGECKO_API = "https://api.coingecko.com/api/v3"
+COINGECKO_PREFIX = "coingecko/"
+VS_CURRENCY = "usd"
+
+_DAY_MS = 1440 * 60 * 1000
+
+
+class RateLimiter:
+    """
+    令牌桶限流（進程內共用）：平均每分鐘最多 per_minute 次，令牌不足時只等待到下一個令牌為止
+    收到 429 時以 Retry-After 暫停所有請求
+    """
+
+    def __init__(self, per_minute=10, burst=3):
+        self.per_minute = per_minute
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _wait_time(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.per_minute / 60)
+        self._refilled_at = now
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) * 60 / self.per_minute
+
+    def acquire(self, max_wait=30.0):
+        """取得一個令牌；需等待超過 max_wait 秒時拋出 ValueError"""
+        while True:
+            with self._lock:
+                wait = self._wait_time(time.monotonic())
+            if wait <= 0:
+                return
+            if wait > max_wait:
+                raise ValueError(f"CoinGecko 請求過於頻繁，請 {wait:.0f} 秒後再試")
+            time.sleep(wait)
+
+    def block(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+RATE_LIMITER = RateLimiter(per_minute=int(os.environ.get('CRYMAP_COINGECKO_PER_MINUTE', 10)))
+
+
+def _request_json(endpoint, params, timeout):
+    for attempt in range(2):
+        RATE_LIMITER.acquire()
+        response = requests.get(f"{COINGECKO_API}/{endpoint}", params=params, timeout=timeout)
+        if response.status_code != 429:
+            return response.json()
+        RATE_LIMITER.block(float(response.headers.get('Retry-After', 60)))
+    raise ValueError("CoinGecko API 限流 (429)")
+
+
+def get_json(endpoint, params=None, timeout=10):
+    """調用 CoinGecko 公開 API（限流，併發的相同請求只發出一次）"""
+    params = params or {}
+    key = ("coingecko", endpoint, tuple(sorted(params.items())))
+    return REQUEST_COALESCER.do(key, _request_json, endpoint, params, timeout)
+
+
+def coingecko_symbol(coin_id):
+    return f"{COINGECKO_PREFIX}{coin_id}"
+
+
+def chart_interval(days):
+    """market_chart 在該天數下返回的數據粒度"""
+    if days <= 1:
+        return '5m'
+    return '1h' if days <= 90 else '1d'
+
+
+def coingecko_request(coin_id, days):
+    """web.py 的 (幣種, 天數) -> 與 Binance 路徑相同的 (symbol, interval, limit)"""
+    interval = chart_interval(days)
+    return coingecko_symbol(coin_id), interval, days * _DAY_MS // INTERVAL_MS[interval]
+
+
+def market_chart_to_dataframe(data, interval):
+    """
+    將 market_chart 的 prices / total_volumes 以時間戳對齊後轉為K線格式的 DataFrame
+    時間戳向下取整到 interval，同一區間內取最後一筆；只保留同時有價格與成交量的區間
+    每個區間只有一個價格樣本，open/high/low/close 皆為該價格；volume 為 CoinGecko 的24小時成交額
+    """
+    step = INTERVAL_MS[interval]
+
+    def series(points, name):
+        if not points:
+            return pd.Series(dtype=np.float64, name=name)
+        arr = np.asarray(points, dtype=np.float64)
+        buckets = arr[:, 0].astype(np.int64) // step * step
+        s = pd.Series(arr[:, 1], index=buckets, name=name)
+        return s[~s.index.duplicated(keep='last')]
+
+    joined = pd.concat([series(data.get('prices'), 'close'),
+                        series(data.get('total_volumes'), 'volume')], axis=1, join='inner').dropna()
+    joined = joined.sort_index()
+    return _to_klines(joined.index.to_numpy(dtype=np.int64), joined['close'].to_numpy(),
+                      joined['volume'].to_numpy(), step)
+
+
+def _to_klines(open_time, price, volume, step):
+    n = len(open_time)
+    columns = {
+        'open_time': open_time,
+        'open': price, 'high': price, 'low': price, 'close': price,
+        'volume': volume,
+        'close_time': open_time + step - 1,
+        'quote_asset_volume': volume,
+        'number_of_trades': np.zeros(n, dtype=np.int64),
+        'taker_buy_base_asset_volume': np.full(n, np.nan),
+        'taker_buy_quote_asset_volume': np.full(n, np.nan),
+    }
+    return columns_to_dataframe({col: np.asarray(columns[col], dtype=dtype) for col, dtype in STORE_COLUMNS.items()})
+
+
+def fetch_market_chart(coin_id, days, timeout=10):
+    """獲取 /coins/{id}/market_chart，API 返回錯誤時拋出 ValueError"""
+    data = get_json(f"coins/{coin_id}/market_chart", {'vs_currency': VS_CURRENCY, 'days': str(days)}, timeout)
+    if not isinstance(data, dict) or 'prices' not in data:
+        raise ValueError(f"CoinGecko 返回錯誤: {data}")
+    return market_chart_to_dataframe(data, chart_interval(days))
+
+
+def fetch_live_point(coin_id, interval, timeout=10):
+    """以 /simple/price 獲取最新價格與24小時成交額，作為當前（未收盤）區間的一筆"""
+    data = get_json("simple/price", {'ids': coin_id, 'vs_currencies': VS_CURRENCY,
+                                     'include_24hr_vol': 'true'}, timeout)
+    quote = data.get(coin_id) if isinstance(data, dict) else None
+    if not quote or VS_CURRENCY not in quote:
+        raise ValueError(f"CoinGecko 返回錯誤: {data}")
+    step = INTERVAL_MS[interval]
+    now_ms = int(time.time() * 1000)
+    return _to_klines(np.array([now_ms // step * step]), np.array([quote[VS_CURRENCY]]),
+                      np.array([quote.get(f'{VS_CURRENCY}_24h_vol', np.nan)]), step)
+
+
+def fetch_coingecko_stored(symbol, interval, limit, store=None):
+    """
+    與 kline_store.fetch_klines_stored 相同介面的 CoinGecko 數據獲取（symbol 為 coingecko_symbol）
+    本地存檔已覆蓋所需區間且包含最後一個已收盤區間時，只請求一次 /simple/price 補上最新一筆；
+    否則請求 market_chart，已收盤的區間寫回存檔
+    """
+    store = store or KLINE_STORE
+    coin_id = symbol[len(COINGECKO_PREFIX):]
+    step = INTERVAL_MS[interval]
+    now_ms = int(time.time() * 1000)
+    current = now_ms // step * step
+
+    if store is not None:
+        stored = store.read(symbol, interval, current - limit * step, current)
+        if len(stored) and stored['open_time'].iloc[-1] == current - step \
+                and stored['open_time'].iloc[0] <= current - (limit - 1) * step:
+            combined = pd.concat([stored, fetch_live_point(coin_id, interval)])
+            return combined.iloc[-limit:]
+
+    days = max(1, -(-limit * step // _DAY_MS))
+    df = fetch_market_chart(coin_id, days)
+    if store is not None:
+        closed = df[df['close_time'] < now_ms]
+        if len(closed):
+            store.write(symbol, interval, dataframe_to_columns(closed))
+    return df.iloc[-limit:]
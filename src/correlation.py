@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster, leaves_list
+from scipy.spatial.distance import squareform
+
+# 跨幣種相關性 / Beta 分析
+# 所有交易對的統計量都由同一組矩陣乘法一次算出，缺失值以遮罩 (mask) 處理，
+# 不需要逐對迴圈，數百個交易對 × 數千根K線也能在一秒內完成
+
+
+def align_closes(closes):
+    """
+    將 {symbol: close Series} 對齊到共同的時間索引
+    返回 DataFrame（行: 時間，列: 交易對），缺失值保留為 NaN
+    """
+    if not closes:
+        return pd.DataFrame()
+    aligned = pd.concat(closes, axis=1, sort=True)
+    return aligned.dropna(how='all')
+
+
+def log_returns(close_df):
+    """計算對數報酬率矩陣 (T-1, N)，任一端缺失則為 NaN"""
+    values = close_df.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(values), axis=0)
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def pairwise_moments(returns):
+    """
+    計算成對有效樣本下的共變異數與變異數
+    returns: (T, N) 報酬率，NaN 代表缺失
+    返回 (count, cov, var_row, var_col)，皆為 (N, N)：
+    var_row[i, j] 為 i 在 i、j 共同有效時段內的變異數，var_col[i, j] 則為 j 的
+    """
+    mask = np.isfinite(returns).astype(np.float64)
+    x = np.where(mask > 0, returns, 0.0)
+
+    count = mask.T @ mask
+    sum_row = x.T @ mask            # sum_row[i, j] = Σ x_i （i、j 都有效）
+    sum_sq_row = (x * x).T @ mask
+    cross = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = np.where(count > 1, count - 1, np.nan)
+        mean_row = sum_row / count
+        cov = (cross - sum_row * mean_row.T) / denom
+        var_row = (sum_sq_row - sum_row * mean_row) / denom
+    return count, cov, var_row, var_row.T
+
+
+def correlation_matrix(returns, min_periods=10):
+    """成對有效樣本的 Pearson 相關係數矩陣"""
+    count, cov, var_row, var_col = pairwise_moments(returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(var_row * var_col)
+    corr[count < min_periods] = np.nan
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def beta_to_benchmark(returns, benchmark_idx, min_periods=10):
+    """各交易對相對基準（如 BTCUSDT）的 Beta"""
+    count, cov, var_row, var_col = pairwise_moments(returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = cov[:, benchmark_idx] / var_col[:, benchmark_idx]
+    beta[count[:, benchmark_idx] < min_periods] = np.nan
+    return beta
+
+
+def rolling_correlation(returns, benchmark_idx, window=30):
+    """
+    各交易對與基準的滾動相關係數，以累積和一次計算所有交易對
+    返回 (T, N)，前 window-1 行及樣本不足處為 NaN
+    """
+    bench = returns[:, [benchmark_idx]]
+    mask = (np.isfinite(returns) & np.isfinite(bench)).astype(np.float64)
+    x = np.where(mask > 0, returns, 0.0)
+    y = np.where(mask > 0, bench, 0.0)
+
+    def window_sum(a):
+        c = np.cumsum(a, axis=0)
+        out = c.copy()
+        out[window:] = c[window:] - c[:-window]
+        out[:window - 1] = np.nan
+        return out
+
+    n = window_sum(mask)
+    sx, sy = window_sum(x), window_sum(y)
+    sxx, syy, sxy = window_sum(x * x), window_sum(y * y), window_sum(x * y)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < max(3, window // 2)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def cluster_order(corr, max_clusters=8):
+    """
+    以相關距離 sqrt((1 - ρ) / 2) 做階層式聚類
+    返回 (排序索引, 聚類標籤)，排序後相似的交易對會相鄰，方便熱力圖閱讀
+    """
+    n = corr.shape[0]
+    if n < 3:
+        return np.arange(n), np.ones(n, dtype=int)
+    filled = np.nan_to_num(corr, nan=0.0)
+    dist = np.sqrt(np.clip((1.0 - filled) / 2.0, 0.0, 1.0))
+    np.fill_diagonal(dist, 0.0)
+    z = linkage(squareform(dist, checks=False), method='average')
+    labels = fcluster(z, t=min(max_clusters, n), criterion='maxclust')
+    return leaves_list(z), labels
+
+
+def analyze_correlation(close_df, benchmark='BTCUSDT', window=30, max_clusters=8):
+    """
+    對齊後的收盤價矩陣 -> 相關係數、Beta、滾動相關與聚類
+    返回 dict：
+      corr: 依聚類排序的相關係數 DataFrame
+      beta: 相對基準的 Beta Series
+      rolling: 與基準的滾動相關 DataFrame
+      clusters: 聚類標籤 Series
+    """
+    symbols = list(close_df.columns)
+    returns = log_returns(close_df)
+    index = close_df.index[1:]
+
+    corr = correlation_matrix(returns)
+    order, labels = cluster_order(corr, max_clusters)
+    ordered = [symbols[i] for i in order]
+    result = {
+        'corr': pd.DataFrame(corr, index=symbols, columns=symbols).loc[ordered, ordered],
+        'clusters': pd.Series(labels, index=symbols).loc[ordered],
+        'beta': None,
+        'rolling': None,
+    }
+
+    if benchmark in symbols:
+        b = symbols.index(benchmark)
+        result['beta'] = pd.Series(beta_to_benchmark(returns, b), index=symbols)
+        result['rolling'] = pd.DataFrame(rolling_correlation(returns, b, window), index=index, columns=symbols)
+    return result
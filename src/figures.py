@@ -0,0 +1,281 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from scipy.stats import norm
+
+from analysis import MAX_RESISTANCE, MAX_SUPPORT
+
+# Plotly 圖表構建
+# 同一份數據（以指紋識別）的圖表只構建一次並在所有 session 間共用；
+# 水平線與標註組成單一 shapes / annotations 列表，一次 update_layout 寫入，
+# 不再逐條 add_vline / add_annotation（每次調用都會重新驗證並複製整個 layout）
+# 當前價格每次重跑都在變：緩存的圖表不含價格線，由 with_price_line 在副本上疊加
+
+
+class FigureCache:
+    """以數據指紋為鍵的 go.Figure LRU 緩存（緩存中的圖表視為唯讀）"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._figures = OrderedDict()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+                return fig
+        fig = build()
+        with self._lock:
+            self._figures[key] = fig
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return fig
+
+    def get_latest(self, slot, key, build):
+        """每個 slot 只保留最近一個 key 的圖表（數據持續更新的圖表用，如深度熱圖）"""
+        with self._lock:
+            entry = self._figures.get(slot)
+            if entry is not None and entry[0] == key:
+                self._figures.move_to_end(slot)
+                return entry[1]
+        fig = build()
+        with self._lock:
+            self._figures[slot] = (key, fig)
+            self._figures.move_to_end(slot)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return fig
+
+
+# 不在 CRYMAP_CACHE_MB 預算內，以條目數限量（見 kline_cache.py）
+FIGURE_CACHE = FigureCache(max_entries=int(os.environ.get('CRYMAP_FIGURE_CACHE_ENTRIES', 128)))
+# 深度熱圖每個快照都會變：每個交易對只保留最新一張，不佔用 FIGURE_CACHE
+DEPTH_FIGURES = FigureCache(max_entries=10)
+
+
+def data_fingerprint(df):
+    """K線數據指紋：已收盤的K線不會變化，只需比對長度、首尾時間與最後一根K線"""
+    if len(df) == 0:
+        return (0,)
+    last = df.iloc[-1]
+    return (len(df), int(df['open_time'].iloc[0]), int(last['open_time']),
+            float(last['close']), float(last['volume']))
+
+
+def vline_shapes(xs, color, dash="dot", width=1):
+    """豎直參考線（y 方向佔滿繪圖區）"""
+    return [
+        dict(type="line", xref="x", yref="paper", x0=x, x1=x, y0=0, y1=1,
+             line=dict(color=color, dash=dash, width=width))
+        for x in xs
+    ]
+
+
+def vline_labels(xs, texts, position="bottom left"):
+    """對應 add_vline(annotation_text=..., annotation_position=...) 的標籤"""
+    yside, xside = position.split()
+    return [
+        dict(x=x, xref="x", y=0 if yside == "bottom" else 1, yref="paper",
+             text=text, showarrow=False,
+             xanchor="right" if xside == "left" else "left",
+             yanchor="bottom" if yside == "bottom" else "top")
+        for x, text in zip(xs, texts)
+    ]
+
+
+def hline_shapes(ys, color, dash="dash", width=1):
+    """水平參考線（x 方向佔滿繪圖區）"""
+    return [
+        dict(type="line", xref="paper", yref="y", x0=0, x1=1, y0=y, y1=y,
+             line=dict(color=color, dash=dash, width=width))
+        for y in ys
+    ]
+
+
+def with_price_line(fig, shapes, annotations=()):
+    """在緩存圖表的副本上追加當前價格線與標註（緩存中的圖表保持不變）"""
+    fig = go.Figure(fig)
+    fig.update_layout(shapes=list(fig.layout.shapes) + list(shapes),
+                      annotations=list(fig.layout.annotations) + list(annotations))
+    return fig
+
+
+def level_annotations(xs, ys, label, color):
+    """支撐 / 阻力位的箭頭標註"""
+    return [
+        dict(x=x, y=y, text=f"{label}: ${x:.6f}", showarrow=True, arrowhead=1,
+             arrowcolor=color, font=dict(size=10))
+        for x, y in zip(xs, ys)
+    ]
+
+
+def price_distribution_figure(key, distribution, current_price, max_peaks=MAX_RESISTANCE, max_troughs=MAX_SUPPORT):
+    """成交量加權 KDE 價格分布圖，附當前價格、阻力位（峰值）與支撐位（谷值）"""
+    def build():
+        x_vals = distribution['x_vals']
+        kde_vals = distribution['kde_vals']
+        peaks = distribution['peaks'][:max_peaks]
+        troughs = distribution['troughs'][:max_troughs]
+
+        fig = go.Figure(go.Scatter(
+            x=x_vals, y=kde_vals,
+            fill='tozeroy',
+            mode='lines',
+            line_color='orange',
+            name='價格密度分布',
+            fillcolor='rgba(255,165,0,0.3)'
+        ))
+
+        shapes = vline_shapes(x_vals[peaks], "blue")
+        shapes += vline_shapes(x_vals[troughs], "gray")
+        annotations = level_annotations(x_vals[peaks], kde_vals[peaks] * 1.1, "阻力", "blue")
+        annotations += level_annotations(x_vals[troughs], kde_vals[troughs] * 0.5, "支撐", "gray")
+
+        fig.update_layout(
+            shapes=shapes,
+            annotations=annotations,
+            height=500,
+            margin=dict(l=20, r=20, t=30, b=20),
+            xaxis_title="價格 (USDT)",
+            yaxis_title="加權密度",
+            template="plotly_white"
+        )
+        return fig
+    fig = FIGURE_CACHE.get_or_build(('distribution', key), build)
+    return with_price_line(fig, vline_shapes([current_price], "white", dash="dash", width=3),
+                           vline_labels([current_price], [f"當前價格: ${current_price:.6f}"], "bottom right"))
+
+
+def volatility_figure(key, volatility_data, mean_vol, std_vol, latest_vol, period_name):
+    """波動率常態分布圖，附均值、±1σ、±2σ 與最新波動率"""
+    def build():
+        x = np.linspace(volatility_data.min(), volatility_data.max(), 500)
+        y = norm.pdf(x, mean_vol, std_vol)
+
+        fig = go.Figure(go.Scatter(
+            x=x, y=y,
+            mode='lines',
+            name='常態分布',
+            line=dict(color='red', width=2)
+        ))
+
+        sigma_lines = [mean_vol, mean_vol + std_vol, mean_vol - std_vol, mean_vol + 2*std_vol, mean_vol - 2*std_vol]
+        shapes = vline_shapes(sigma_lines[:1], "blue", dash="dash")
+        shapes += vline_shapes(sigma_lines[1:3], "green", dash="dash")
+        shapes += vline_shapes(sigma_lines[3:], "red", dash="dash")
+        shapes += vline_shapes([latest_vol], "orange", width=3)
+        annotations = vline_labels(sigma_lines, ["均值", "+1σ", "-1σ", "+2σ", "-2σ"])
+        annotations += vline_labels([latest_vol], [f"最新: {latest_vol:.2%}"], "top right")
+
+        fig.update_layout(
+            shapes=shapes,
+            annotations=annotations,
+            height=500,
+            margin=dict(l=20, r=20, t=30, b=20),
+            xaxis_title=f"{period_name}波動率 (%)",
+            yaxis_title="密度",
+            template="plotly_white",
+            showlegend=True
+        )
+        return fig
+    return FIGURE_CACHE.get_or_build(('volatility', key), build)
+
+
+def candlestick_figure(key, df):
+    """價格趨勢K線圖"""
+    def build():
+        fig = go.Figure(go.Candlestick(
+            x=df.index,
+            open=df['open'],
+            high=df['high'],
+            low=df['low'],
+            close=df['close'],
+            name='價格'
+        ))
+        fig.update_layout(
+            height=400,
+            xaxis_title="時間",
+            yaxis_title="價格 (USDT)",
+            template="plotly_white",
+            xaxis_rangeslider_visible=False
+        )
+        return fig
+    return FIGURE_CACHE.get_or_build(('candlestick', key), build)
+
+
+def volume_figure(key, df):
+    """成交量柱狀圖"""
+    def build():
+        fig = go.Figure(go.Bar(
+            x=df.index,
+            y=df['volume'],
+            name='成交量',
+            marker_color='lightblue'
+        ))
+        fig.update_layout(
+            height=300,
+            xaxis_title="時間",
+            yaxis_title="成交量",
+            template="plotly_white"
+        )
+        return fig
+    return FIGURE_CACHE.get_or_build(('volume', key), build)
+
+
+def depth_heatmap_figure(symbol, heatmap, current_price):
+    """訂單簿深度熱圖：買單為正、賣單為負，只顯示有掛單的價格範圍（每個交易對只緩存最新一張）"""
+    def build():
+        times, bids, asks = heatmap.matrix()
+        z = (bids - asks).T  # (價格, 時間)
+        rows = np.flatnonzero(z.any(axis=1))
+        lo, hi = (rows[0], rows[-1] + 1) if len(rows) else (0, len(heatmap.grid))
+        z = z[lo:hi]
+        # 以 99 百分位截斷色階，避免單一大額掛單壓暗其餘價位
+        scale = float(np.percentile(np.abs(z[z != 0]), 99)) if np.any(z) else 1.0
+        fig = go.Figure(go.Heatmap(
+            x=pd.to_datetime(times, unit='ms'),
+            y=heatmap.grid[lo:hi],
+            z=z,
+            zmin=-scale, zmax=scale, zmid=0,
+            colorscale="RdYlGn",
+            colorbar=dict(title="買(+) / 賣(-)"),
+            name='深度'
+        ))
+        fig.update_layout(
+            height=400,
+            xaxis_title="時間",
+            yaxis_title="價格 (USDT)",
+            template="plotly_white",
+        )
+        return fig
+    key = (float(heatmap.grid[0]), float(heatmap.grid[-1]), heatmap.version)
+    fig = DEPTH_FIGURES.get_latest(symbol, key, build)
+    return with_price_line(fig, hline_shapes([current_price], "black"))
+
+
+def volume_at_price_figure(key, grid, buy, sell, current_price):
+    """逐筆成交價量分布：主動買入 / 主動賣出堆疊的橫向柱狀圖（價格網格與 KDE 相同）"""
+    def build():
+        rows = np.flatnonzero((buy + sell) > 0)
+        lo, hi = (rows[0], rows[-1] + 1) if len(rows) else (0, len(grid))
+        fig = go.Figure([
+            go.Bar(x=buy[lo:hi], y=grid[lo:hi], orientation='h', name='主動買入', marker_color='seagreen'),
+            go.Bar(x=sell[lo:hi], y=grid[lo:hi], orientation='h', name='主動賣出', marker_color='indianred'),
+        ])
+        fig.update_layout(
+            height=500,
+            barmode='stack',
+            bargap=0,
+            xaxis_title="成交量",
+            yaxis_title="價格 (USDT)",
+            template="plotly_white",
+        )
+        return fig
+    fig = FIGURE_CACHE.get_or_build(('volume_at_price', key), build)
+    return with_price_line(fig, hline_shapes([current_price], "black"))
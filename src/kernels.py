@@ -0,0 +1,171 @@
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+# 熱點數值計算核心
+# 安裝 numba 時使用 JIT 編譯的迴圈版本，否則（例如 stlite / Pyodide）使用等價的純 NumPy 版本；
+# 兩種實現都保留為 *_numpy / *_numba，方便 benchmark_kernels.py 比較
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba 為可選依賴
+    NUMBA_AVAILABLE = False
+
+# KDE 截斷範圍（頻寬倍數），exp(-0.5 * 8²) ≈ 1e-14，可忽略
+KDE_CUTOFF = 8.0
+
+
+def scott_bandwidth(points, weights):
+    """與 gaussian_kde(points, weights=weights) 相同的 Scott 規則頻寬"""
+    w = weights / weights.sum()
+    mean = np.dot(w, points)
+    sum_w2 = np.dot(w, w)
+    var = np.dot(w, (points - mean) ** 2) / (1 - sum_w2)
+    return (1 / sum_w2) ** (-1 / 5) * np.sqrt(var)
+
+
+# === 加權高斯 KDE ===
+def weighted_kde_numpy(points, weights, grid, bandwidth, chunk_size=256):
+    """在 grid 上計算加權高斯 KDE（weights 需已正規化），按 grid 分塊避免 (m, n) 大矩陣"""
+    out = np.empty(len(grid))
+    norm = 1 / (np.sqrt(2 * np.pi) * bandwidth)
+    for start in range(0, len(grid), chunk_size):
+        z = (grid[start:start + chunk_size, None] - points[None, :]) / bandwidth
+        out[start:start + chunk_size] = np.exp(-0.5 * z * z) @ weights * norm
+    return out
+
+
+def _weighted_kde_loop(points, weights, grid, bandwidth, cutoff):
+    # points 已排序、grid 遞增：以雙指針只累加 ±cutoff 頻寬內的點
+    n, m = len(points), len(grid)
+    out = np.zeros(m)
+    norm = 1 / (np.sqrt(2 * np.pi) * bandwidth)
+    reach = cutoff * bandwidth
+    lo = 0
+    for j in range(m):
+        x = grid[j]
+        while lo < n and points[lo] < x - reach:
+            lo += 1
+        total = 0.0
+        i = lo
+        while i < n and points[i] <= x + reach:
+            z = (x - points[i]) / bandwidth
+            total += weights[i] * np.exp(-0.5 * z * z)
+            i += 1
+        out[j] = total * norm
+    return out
+
+
+# === 峰值 / 谷值 ===
+def local_extrema_numpy(values, order=20):
+    """
+    與 argrelextrema(values, np.greater / np.less, order=order) 結果相同的峰值、谷值索引
+    以 O(n) 的滑動最大 / 最小值濾波一次比較左右 order 個鄰點（邊界以端點值填充，等同 mode='clip'）
+    """
+    n = len(values)
+    if n < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    results = []
+    for window_filter, compare in ((maximum_filter1d, np.greater), (minimum_filter1d, np.less)):
+        # trailing[j] = 極值(values[j-order+1 .. j])，leading[j] = 極值(values[j .. j+order-1])
+        trailing = window_filter(values, size=order, mode='nearest', origin=(order - 1) // 2)
+        leading = window_filter(values, size=order, mode='nearest', origin=-(order // 2))
+        inner = values[1:-1]
+        mask = compare(inner, trailing[:-2]) & compare(inner, leading[2:])
+        results.append(np.flatnonzero(mask) + 1)
+    return results[0], results[1]
+
+
+def _local_extrema_loop(values, order):
+    n = len(values)
+    is_peak = np.zeros(n, dtype=np.bool_)
+    is_trough = np.zeros(n, dtype=np.bool_)
+    for i in range(1, n - 1):
+        v = values[i]
+        peak = True
+        trough = True
+        for k in range(1, order + 1):
+            left = values[max(i - k, 0)]
+            right = values[min(i + k, n - 1)]
+            if not (v > left and v > right):
+                peak = False
+            if not (v < left and v < right):
+                trough = False
+            if not peak and not trough:
+                break
+        is_peak[i] = peak
+        is_trough[i] = trough
+    return np.flatnonzero(is_peak), np.flatnonzero(is_trough)
+
+
+# === 百分位排名 ===
+def percentile_rank(data, values):
+    """values 中每個值在 data 分布中的百分位（data <= value 的比例 × 100）"""
+    data = np.sort(np.asarray(data, dtype=np.float64))
+    if len(data) == 0:
+        return np.full(np.shape(values), 50.0)
+    return np.searchsorted(data, values, side='right') / len(data) * 100
+
+
+# === K線內成交量分布 ===
+INTRACANDLE_MODELS = ('uniform', 'triangular')
+
+
+def _intracandle_cdf(x, low, high, close, model):
+    # 各K線的價格分布在 x 處的累積比例；low / high / close 形狀 (n, 1)，x 形狀 (1, m)
+    width = high - low
+    degenerate = ~(width > 0)
+    safe_width = np.where(degenerate, 1.0, width)
+    if model == 'uniform':
+        cdf = np.clip((x - low) / safe_width, 0.0, 1.0)
+    else:
+        # 以 close 為眾數的三角分布；close 落在 low / high 上時只剩單側
+        mode = np.clip(close, low, high)
+        left = np.where(mode > low, mode - low, 1.0) * safe_width
+        right = np.where(high > mode, high - mode, 1.0) * safe_width
+        xc = np.clip(x, low, high)
+        cdf = np.where(xc <= mode, (xc - low) ** 2 / left, 1.0 - (high - xc) ** 2 / right)
+    # high == low（或缺失）的K線整根成交量落在該價格
+    return np.where(degenerate, (x >= low).astype(np.float64), cdf)
+
+
+def candle_volume_profile(low, high, close, volume, grid, model='uniform', chunk_size=4096):
+    """
+    將每根K線的成交量按 model 分攤到其 low–high 區間，累加到等距價格網格（網格點為箱中心）
+    'uniform' 為區間內均勻分布，'triangular' 為以收盤價為眾數的三角分布
+    對所有K線 × 價格箱一次廣播計算各箱的累積比例差（K線數超過 chunk_size 時分塊）
+    返回長度 len(grid) 的各箱成交量；網格範圍外的部分不計入
+    """
+    if model not in INTRACANDLE_MODELS:
+        raise ValueError(f"未知的K線內分布模型: {model}")
+    grid = np.asarray(grid, dtype=np.float64)
+    step = (grid[-1] - grid[0]) / (len(grid) - 1) if len(grid) > 1 else 1.0
+    edges = np.concatenate([grid - step / 2, [grid[-1] + step / 2]])[None, :]
+    columns = [np.asarray(a, dtype=np.float64)[:, None] for a in (low, high, close)]
+    volume = np.asarray(volume, dtype=np.float64)
+    out = np.zeros(len(grid))
+    for start in range(0, len(volume), chunk_size):
+        lo, hi, cl = (c[start:start + chunk_size] for c in columns)
+        fractions = np.diff(_intracandle_cdf(edges, lo, hi, cl, model), axis=1)
+        out += volume[start:start + chunk_size] @ fractions
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _weighted_kde_jit = njit(cache=True, fastmath=False)(_weighted_kde_loop)
+    _local_extrema_jit = njit(cache=True)(_local_extrema_loop)
+
+    def weighted_kde_numba(points, weights, grid, bandwidth):
+        order = np.argsort(points, kind='stable')
+        return _weighted_kde_jit(np.ascontiguousarray(points[order], dtype=np.float64),
+                                 np.ascontiguousarray(weights[order], dtype=np.float64),
+                                 np.ascontiguousarray(grid, dtype=np.float64), float(bandwidth), KDE_CUTOFF)
+
+    def local_extrema_numba(values, order=20):
+        return _local_extrema_jit(np.ascontiguousarray(values, dtype=np.float64), order)
+
+    weighted_kde = weighted_kde_numba
+    local_extrema = local_extrema_numba
+else:
+    weighted_kde = weighted_kde_numpy
+    local_extrema = local_extrema_numpy
@@ -0,0 +1,224 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from market_data import INTERVAL_MS
+from analysis import summarize
+from kline_store import fetch_klines_stored
+
+# 進程內K線緩存：同一個 streamlit 進程的所有 session 與背景預取工作共用
+# 每筆數據在下一根K線收盤前有效（最多 max_age 秒，避免未收盤K線過舊）
+# 緩存的 DataFrame 為精簡、唯讀共用的表示（見 compact_klines），總大小受 max_bytes 限制
+
+# 緩存中保留的欄位：圖表 / 統計 / API 實際用到的欄位
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+COMPACT_COLUMNS = ['open_time'] + PRICE_COLUMNS + ['volume', 'close_time']
+# app 顯示價格的小數位數：float32 在此精度下無損時才以 float32 保存價格
+PRICE_DECIMALS = 6
+
+
+def _price_dtype(values):
+    as32 = values.astype(np.float32).astype(np.float64)
+    lossless = np.array_equal(np.round(as32, PRICE_DECIMALS), np.round(values, PRICE_DECIMALS), equal_nan=True)
+    return np.float32 if lossless else np.float64
+
+
+def compact_klines(df):
+    """
+    只保留 COMPACT_COLUMNS 的精簡K線 DataFrame（索引不變）
+    成交量一律為 float32；價格在顯示精度內無損時為 float32，否則保留 float64
+    各欄位陣列設為唯讀（以 copy=False 直接引用，pandas >= 2.0），就地修改共用數據時拋出 ValueError；
+    這無法阻止對同一物件新增 / 替換欄位，需要修改的調用方應先 df.copy()
+    """
+    prices = np.column_stack([df[col].to_numpy(dtype=np.float64) for col in PRICE_COLUMNS]) \
+        if len(df) else np.empty((0, len(PRICE_COLUMNS)))
+    price_dtype = _price_dtype(prices)
+    data = {'open_time': df['open_time'].to_numpy(dtype=np.int64)}
+    for i, col in enumerate(PRICE_COLUMNS):
+        data[col] = prices[:, i].astype(price_dtype)
+    data['volume'] = df['volume'].to_numpy(dtype=np.float32)
+    data['close_time'] = df['close_time'].to_numpy(dtype=np.int64)
+    for col, values in data.items():
+        if values.base is not None:
+            # 可能是輸入 DataFrame 的視圖：複製一份再設唯讀，不影響調用方的原始數據
+            data[col] = values = values.copy()
+        values.flags.writeable = False
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+
+def nbytes(obj):
+    """估算緩存項佔用的記憶體（DataFrame / Series / ndarray，以及其 dict / list 組合）"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(v) for v in obj)
+    return 0
+
+
+class KlineCache:
+    """
+    以 (symbol, interval, limit) 為鍵的K線與衍生統計緩存，並記錄各交易對的近期訪問熱度
+    max_bytes 為記憶體預算（None 不限）：超出時先淘汰已過期的項，再按最近最少使用淘汰
+    """
+
+    def __init__(self, max_age=300, access_half_life=3600, max_bytes=None):
+        self.max_age = max_age
+        self.access_half_life = access_half_life
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 按最近使用排序
+        self._access = {}  # symbol -> (衰減後的訪問次數, 上次訪問時間)
+        self._evicted = {}  # 被淘汰的鍵 -> 原失效時間
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def expires_at(self, df, interval, fetched_at):
+        """數據失效時間：最後一根K線收盤或 max_age 到期，取較早者"""
+        if df is not None and len(df) > 0 and 'close_time' in df:
+            next_close = (int(df['close_time'].iloc[-1]) + 1) / 1000
+        else:
+            next_close = fetched_at + INTERVAL_MS.get(interval, 60 * 1000) / 1000
+        if next_close <= fetched_at:
+            # 最後一根K線已收盤（例如交易暫停），按週期推算下一根
+            next_close = fetched_at + INTERVAL_MS.get(interval, 60 * 1000) / 1000
+        return min(next_close, fetched_at + self.max_age)
+
+    def record_access(self, symbol, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            score, last = self._access.get(symbol, (0.0, now))
+            decay = math.exp(-(now - last) * math.log(2) / self.access_half_life)
+            self._access[symbol] = (score * decay + 1.0, now)
+
+    def access_score(self, symbol, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            score, last = self._access.get(symbol, (0.0, now))
+        return score * math.exp(-(now - last) * math.log(2) / self.access_half_life)
+
+    def top_symbols(self, n, now=None):
+        """依近期訪問熱度排序的前 n 個交易對"""
+        now = time.time() if now is None else now
+        with self._lock:
+            symbols = list(self._access)
+        return sorted(symbols, key=lambda s: self.access_score(s, now), reverse=True)[:n]
+
+    def get(self, symbol, interval, limit, record=True, now=None):
+        """
+        讀取未過期的緩存項，返回 dict(df, derived, fetched_at, expires_at) 或 None
+        record=True 時計入訪問熱度（背景工作查詢時應傳 False）
+        """
+        now = time.time() if now is None else now
+        if record:
+            self.record_access(symbol, now)
+        key = (symbol, interval, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or entry['expires_at'] <= now:
+            return None
+        return entry
+
+    def peek(self, symbol, interval, limit):
+        """讀取緩存項（不論是否過期，不計入訪問熱度）"""
+        with self._lock:
+            return self._entries.get((symbol, interval, limit))
+
+    def put(self, symbol, interval, limit, df, derived=None, now=None):
+        now = time.time() if now is None else now
+        df = compact_klines(df)
+        entry = {
+            'df': df,
+            'derived': derived,
+            'fetched_at': now,
+            'expires_at': self.expires_at(df, interval, now),
+            'nbytes': nbytes(df) + nbytes(derived),
+        }
+        key = (symbol, interval, limit)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old['nbytes']
+            self._entries[key] = entry
+            self._evicted.pop(key, None)
+            self.total_bytes += entry['nbytes']
+            self._evict(now)
+        return entry
+
+    def set_derived(self, symbol, interval, limit, df, derived):
+        """為已緩存的同一份 df 補上衍生統計"""
+        with self._lock:
+            entry = self._entries.get((symbol, interval, limit))
+            if entry is not None and entry['df'] is df:
+                size = nbytes(df) + nbytes(derived)
+                self.total_bytes += size - entry['nbytes']
+                entry['derived'] = derived
+                entry['nbytes'] = size
+                self._evict(time.time())
+
+    def _evict(self, now):
+        # 調用方需持有鎖；最新使用的一項永遠保留
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            keys = list(self._entries)[:-1]
+            victim = next((k for k in keys if self._entries[k]['expires_at'] <= now), keys[0])
+            entry = self._entries.pop(victim)
+            self.total_bytes -= entry['nbytes']
+            self._evicted[victim] = entry['expires_at']
+            self.evictions += 1
+
+    def evicted_expiry(self, symbol, interval, limit):
+        """因記憶體預算被淘汰的項原本的失效時間，未被淘汰時返回 None"""
+        with self._lock:
+            return self._evicted.get((symbol, interval, limit))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+
+# 進程共用的單例，記憶體預算由 CRYMAP_CACHE_MB 指定（預設 256 MB）
+# 預算只涵蓋K線與衍生統計；其餘進程內緩存各自限量，總記憶體約為 CRYMAP_CACHE_MB 再加上：
+#   figures.FIGURE_CACHE      最多 CRYMAP_FIGURE_CACHE_ENTRIES 個圖表（預設 128，K線 + 成交量一對約 270 KB，合計約 20 MB）
+#   figures.DEPTH_FIGURES     每個交易對最新的一張深度熱圖（最多 10 個）
+#   orderbook.DEPTH_HEATMAPS  最多 10 個交易對的深度環形緩衝區（每個約 3 MB）
+#   app.py 的 st.cache_data   模擬結果最多 32 組（每組不超過約 0.5 MB）、相關性收盤價矩陣最多 16 組
+KLINE_CACHE = KlineCache(max_bytes=int(os.environ.get('CRYMAP_CACHE_MB', 256)) * 2 ** 20)
+
+
+def load_klines(symbol, interval, limit, cache=KLINE_CACHE, record=True, fetch=fetch_klines_stored):
+    """
+    緩存優先獲取K線，未命中時以 fetch（預設為 Binance 的存檔 / API）抓取並寫入緩存
+    返回緩存項 dict(df, derived, fetched_at, expires_at)，API 錯誤時拋出異常
+    """
+    entry = cache.get(symbol, interval, limit, record=record)
+    if entry is None:
+        entry = cache.put(symbol, interval, limit, fetch(symbol, interval, limit))
+    return entry
+
+
+def load_derived(symbol, interval, limit, entry, cache=KLINE_CACHE):
+    """返回緩存項的衍生統計，尚未計算（例如由 session 抓取而非背景預取）時補算並寫回"""
+    if entry['derived'] is None:
+        derived = summarize(entry['df'], interval)
+        cache.set_derived(symbol, interval, limit, entry['df'], derived)
+        return derived
+    return entry['derived']
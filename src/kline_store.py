@@ -0,0 +1,264 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from market_data import INTERVAL_MS, fetch_klines, fetch_klines_range
+
+try:
+    import fcntl
+except ImportError:  # Windows 等平台沒有 fcntl，只能做到進程內互斥
+    fcntl = None
+
+# 本地K線列式存檔
+# 目錄結構: {root}/{symbol}/{interval}/{片段}/{欄位}.npy，CURRENT 文件按時間順序列出當前的片段
+# 每個片段是一段不重疊、不可修改的時間區間，每個欄位一個 .npy，讀取時以 mmap 映射，只切出需要的區間；
+# 寫入時只把新數據寫成新片段（與既有片段時間重疊時才與重疊的片段合併），再原子替換 CURRENT；
+# 末尾較小的片段按二進位計數的方式逐步合併，片段數維持在對數級別。
+# 不再使用的片段延後到下一次寫入才刪除，剛讀取 CURRENT 的讀取方仍能打開舊片段。
+# 多個進程（app、api_server、archive_import）可共用同一存檔：寫入全程持有該目錄 LOCK 文件的 flock
+
+STORE_COLUMNS = {
+    'open_time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'close_time': np.int64,
+    'quote_asset_volume': np.float64,
+    'number_of_trades': np.int64,
+    'taker_buy_base_asset_volume': np.float64,
+    'taker_buy_quote_asset_volume': np.float64,
+}
+
+
+def empty_columns():
+    return {col: np.empty(0, dtype=dtype) for col, dtype in STORE_COLUMNS.items()}
+
+
+def merge_columns(base, new):
+    """合併兩組欄位並以 open_time 去重（相同時間以 new 為準），按時間排序"""
+    merged = {col: np.concatenate([base[col], new[col]]).astype(dtype, copy=False)
+              for col, dtype in STORE_COLUMNS.items()}
+    # 反轉後 np.unique 取第一次出現的位置，即原順序中最後一次（new 優先）
+    times = merged['open_time'][::-1]
+    _, first = np.unique(times, return_index=True)
+    keep = len(times) - 1 - first
+    return {col: values[keep] for col, values in merged.items()}
+
+
+def columns_to_dataframe(columns):
+    """欄位字典 -> 與 market_data.klines_to_dataframe 相同格式的 DataFrame"""
+    df = pd.DataFrame({col: np.asarray(values) for col, values in columns.items()})
+    df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
+    df.set_index('datetime', inplace=True)
+    return df
+
+
+def dataframe_to_columns(df):
+    return {col: df[col].to_numpy(dtype=dtype) for col, dtype in STORE_COLUMNS.items()}
+
+
+class KlineStore:
+    """以 (symbol, interval) 為單位的列式K線存檔"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    @contextmanager
+    def _locked(self, symbol, interval):
+        """寫入鎖：進程內以 threading.Lock、進程間以目錄下 LOCK 文件的 flock 互斥"""
+        directory = self._dir(symbol, interval)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(os.path.join(directory, 'LOCK'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield directory
+
+    def _current(self, symbol, interval):
+        """CURRENT 列出的片段名（舊格式的單一版本目錄即為一個片段）"""
+        try:
+            with open(os.path.join(self._dir(symbol, interval), 'CURRENT'), 'r') as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def _set_current(self, symbol, interval, segments):
+        directory = self._dir(symbol, interval)
+        pointer = os.path.join(directory, f'CURRENT.{uuid.uuid4().hex[:8]}')
+        with open(pointer, 'w') as f:
+            f.write('\n'.join(segments))
+        os.replace(pointer, os.path.join(directory, 'CURRENT'))
+
+    def _load_segment(self, symbol, interval, segment, mmap=True):
+        path = os.path.join(self._dir(symbol, interval), segment)
+        mode = 'r' if mmap else None
+        return {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mode) for col in STORE_COLUMNS}
+
+    def load_segments(self, symbol, interval, mmap=True):
+        """按時間順序返回 [(片段名, 欄位)]（預設為唯讀 mmap）"""
+        for attempt in range(2):
+            names = self._current(symbol, interval)
+            try:
+                return [(name, self._load_segment(symbol, interval, name, mmap)) for name in names]
+            except FileNotFoundError:
+                # 讀取 CURRENT 之後片段才被刪除（兩次寫入之間）：重新讀取一次
+                if attempt:
+                    raise
+
+    def load_columns(self, symbol, interval, mmap=True):
+        """讀取全部欄位，無數據時返回空欄位；只有一個片段時為唯讀 mmap，否則合併為新陣列"""
+        segments = [columns for _, columns in self.load_segments(symbol, interval, mmap)]
+        if not segments:
+            return empty_columns()
+        if len(segments) == 1:
+            return segments[0]
+        return {col: np.concatenate([columns[col] for columns in segments]) for col in STORE_COLUMNS}
+
+    def last_open_time(self, symbol, interval):
+        segments = self.load_segments(symbol, interval)
+        times = segments[-1][1]['open_time'] if segments else []
+        return int(times[-1]) if len(times) else None
+
+    def read(self, symbol, interval, start_ms=None, end_ms=None, limit=None):
+        """
+        讀取 [start_ms, end_ms) 區間的K線 DataFrame
+        指定 limit 時只返回區間內最後 limit 根（從最新的片段往回讀，只複製需要的部分）
+        """
+        parts = []
+        remaining = limit
+        for _, columns in reversed(self.load_segments(symbol, interval)):
+            times = columns['open_time']
+            lo = 0 if start_ms is None else np.searchsorted(times, start_ms, side='left')
+            hi = len(times) if end_ms is None else np.searchsorted(times, end_ms, side='left')
+            if remaining is not None:
+                lo = max(lo, hi - remaining)
+                remaining -= max(hi - lo, 0)
+            if hi > lo:
+                parts.append({col: values[lo:hi] for col, values in columns.items()})
+            if remaining == 0 or (start_ms is not None and len(times) and times[0] < start_ms):
+                break
+        if not parts:
+            return columns_to_dataframe(empty_columns())
+        return columns_to_dataframe({col: np.concatenate([part[col] for part in reversed(parts)])
+                                     for col in STORE_COLUMNS})
+
+    def write(self, symbol, interval, new_columns):
+        """
+        合併新數據（以 open_time 去重，相同時間以新數據為準）
+        只重寫與新數據時間範圍重疊的片段，其餘片段不動；返回 (新增行數, 總行數)
+        """
+        new = merge_columns(empty_columns(), new_columns)
+        with self._locked(symbol, interval) as directory:
+            # 持鎖後才讀取 CURRENT，其他進程剛發佈的片段也會被保留與合併
+            segments = self.load_segments(symbol, interval)
+            old_names = [name for name, _ in segments]
+            total_before = sum(len(columns['open_time']) for _, columns in segments)
+            if len(new['open_time']) == 0:
+                return 0, total_before
+
+            first, last = new['open_time'][0], new['open_time'][-1]
+            before, after, merged = [], [], new
+            for name, columns in segments:
+                times = columns['open_time']
+                if len(times) == 0:
+                    continue
+                if times[-1] < first:
+                    before.append((name, columns))
+                elif times[0] > last:
+                    after.append((name, columns))
+                else:
+                    merged = merge_columns(columns, merged)
+            segments = before + [(None, merged)] + after
+            # 末尾片段不大於新片段時合併（二進位計數式），避免每次追加都留下一個小片段
+            while not after and len(segments) > 1 and \
+                    len(segments[-2][1]['open_time']) <= len(segments[-1][1]['open_time']):
+                (_, older), (_, newer) = segments[-2], segments.pop()
+                segments[-1] = (None, merge_columns(older, newer))
+
+            names = []
+            for name, columns in segments:
+                if name is None:
+                    name = f"s{int(columns['open_time'][0])}-{uuid.uuid4().hex[:8]}"
+                    os.makedirs(os.path.join(directory, name))
+                    for col, values in columns.items():
+                        np.save(os.path.join(directory, name, f'{col}.npy'), values)
+                names.append(name)
+            total = sum(len(columns['open_time']) for _, columns in segments)
+
+            self._set_current(symbol, interval, names)
+            # 只刪除既不在這一代、也不在上一代 CURRENT 中的片段；上一代保留到下一次寫入
+            referenced = set(names) | set(old_names)
+            for entry in os.listdir(directory):
+                path = os.path.join(directory, entry)
+                if entry not in referenced and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+        return total - total_before, total
+
+
+def open_default_store():
+    """由環境變數 CRYMAP_KLINE_STORE 指定存檔目錄，未設定時返回 None"""
+    root = os.environ.get('CRYMAP_KLINE_STORE')
+    return KlineStore(root) if root else None
+
+
+KLINE_STORE = open_default_store()
+
+
+def fetch_klines_stored(symbol, interval, limit=1000, store=None):
+    """
+    存檔優先獲取最近 limit 根K線
+    存檔之後缺少的部分才向 API 請求，已收盤的K線順便寫回存檔；
+    存檔缺口大於 limit 或未設定存檔時，等同 fetch_klines
+    """
+    store = store or KLINE_STORE
+    if store is None or interval not in INTERVAL_MS:
+        return fetch_klines(symbol, interval, limit)
+    last = store.last_open_time(symbol, interval)
+    step = INTERVAL_MS[interval]
+    now_ms = int(time.time() * 1000)
+    if last is None or (now_ms - last) // step >= limit:
+        return fetch_klines(symbol, interval, limit)
+
+    tail = fetch_klines_range(symbol, interval, last + step)
+    closed = tail[tail['close_time'] < now_ms]
+    if len(closed):
+        store.write(symbol, interval, dataframe_to_columns(closed))
+    head = store.read(symbol, interval, limit=limit)
+    combined = pd.concat([head, tail])
+    combined = combined[~combined.index.duplicated(keep='last')]
+    return combined.iloc[-limit:]
+
+
+def load_history(symbol, interval, start_ms, end_ms=None, store=None):
+    """
+    讀取 [start_ms, end_ms) 區間的歷史K線：存檔已覆蓋的部分直接讀取，
+    只有存檔之前 / 之後缺少的部分才分頁向 API 請求
+    """
+    store = store or KLINE_STORE
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    if store is None or interval not in INTERVAL_MS:
+        return fetch_klines_range(symbol, interval, start_ms, end_ms)
+    step = INTERVAL_MS[interval]
+    stored = store.read(symbol, interval, start_ms, end_ms)
+    if stored.empty:
+        return fetch_klines_range(symbol, interval, start_ms, end_ms)
+
+    parts = [stored]
+    first, last = int(stored['open_time'].iloc[0]), int(stored['open_time'].iloc[-1])
+    if first - start_ms >= step:
+        parts.insert(0, fetch_klines_range(symbol, interval, start_ms, first))
+    if end_ms - last > step:
+        parts.append(fetch_klines_range(symbol, interval, last + step, end_ms))
+    combined = pd.concat(parts)
+    return combined[~combined.index.duplicated(keep='last')]
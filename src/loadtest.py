@@ -0,0 +1,443 @@
+"""
+以多個無頭 session 壓測單個 app.py 進程
+
+    # 1. 準備替身數據：錄製真實 Binance 回應，或離線生成隨機遊走數據
+    python loadtest.py record --fixtures fixtures --symbols BTCUSDT,ETHUSDT,SOLUSDT
+    python loadtest.py record --fixtures fixtures --synthetic 30
+    # 2. 以 10 / 20 / 40 個併發 session 各執行 20 次切換
+    python loadtest.py run --fixtures fixtures --sessions 10 20 40 --steps 20 --latency 80 --rate-limit 1200
+
+run 會在子進程啟動本地 Binance 替身伺服器（回放錄製的數據，可設定延遲、抖動與 429 行為），
+以 CRYMAP_BINANCE_API 讓 app 指向它，再以 streamlit.testing 的 AppTest 在本進程中驅動 N 個 session
+隨機切換交易對（熱度呈長尾分布）與時間範圍。報告每次 rerun 的 p50/p95/p99 延遲、CPU、RSS
+以及替身伺服器收到的上游請求數。替身伺服器也可單獨執行，供真正的 streamlit run 使用：
+
+    python loadtest.py serve --fixtures fixtures --port 18080
+    CRYMAP_BINANCE_API=http://127.0.0.1:18080/api/v3 streamlit run app.py
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+FIXTURE_LIMIT = 1000
+SYMBOL_LABEL = "選擇交易對"
+PERIOD_LABEL = "選擇時間範圍"
+
+
+# === 替身數據 ===
+def fixture_intervals():
+    from market_data import TIME_OPTIONS
+    return sorted({interval for interval, _ in TIME_OPTIONS.values()})
+
+
+def save_fixtures(directory, symbols, klines):
+    """symbols: [(symbol, baseAsset)]；klines: {(symbol, interval): 原始K線列表}"""
+    os.makedirs(os.path.join(directory, "klines"), exist_ok=True)
+    info = {'symbols': [{'symbol': s, 'status': 'TRADING', 'baseAsset': base, 'quoteAsset': 'USDT'}
+                        for s, base in symbols]}
+    with open(os.path.join(directory, "exchangeInfo.json"), "w") as f:
+        json.dump(info, f)
+    for (symbol, interval), rows in klines.items():
+        with open(os.path.join(directory, "klines", f"{symbol}-{interval}.json"), "w") as f:
+            json.dump(rows, f)
+
+
+def record_fixtures(directory, symbols):
+    """從真實 Binance API 錄製每個交易對在各時間範圍週期下的最近 1000 根K線"""
+    from market_data import get_json
+    klines = {}
+    for symbol in symbols:
+        for interval in fixture_intervals():
+            data = get_json("klines", {'symbol': symbol, 'interval': interval, 'limit': FIXTURE_LIMIT})
+            if not isinstance(data, list):
+                raise ValueError(f"API 返回錯誤: {data}")
+            klines[(symbol, interval)] = data
+    save_fixtures(directory, [(s, s[:-4] if s.endswith("USDT") else s) for s in symbols], klines)
+
+
+def synthetic_fixtures(directory, n_symbols, seed=0):
+    """離線生成 n_symbols 個隨機遊走交易對的K線"""
+    from market_data import INTERVAL_MS
+    rng = np.random.default_rng(seed)
+    symbols = [(f"SYN{i:03d}USDT", f"SYN{i:03d}") for i in range(n_symbols)]
+    now_ms = int(time.time() * 1000)
+    klines = {}
+    for symbol, _ in symbols:
+        start_price = 10 ** rng.uniform(-3, 4)
+        for interval in fixture_intervals():
+            step = INTERVAL_MS[interval]
+            open_time = (now_ms // step - FIXTURE_LIMIT + 1 + np.arange(FIXTURE_LIMIT)) * step
+            close = start_price * np.exp(np.cumsum(rng.normal(0, 0.002 * np.sqrt(step / 60000), FIXTURE_LIMIT)))
+            open_ = np.concatenate([[start_price], close[:-1]])
+            spread = np.abs(rng.normal(0, 0.001, FIXTURE_LIMIT)) * close
+            high, low = np.maximum(open_, close) + spread, np.minimum(open_, close) - spread
+            volume = rng.lognormal(5, 1, FIXTURE_LIMIT)
+            klines[(symbol, interval)] = [
+                [int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.4f}", int(t + step - 1),
+                 f"{v * c:.4f}", int(v), f"{v / 2:.4f}", f"{v * c / 2:.4f}", "0"]
+                for t, o, h, l, c, v in zip(open_time, open_, high, low, close, volume)
+            ]
+    save_fixtures(directory, symbols, klines)
+
+
+def load_fixtures(directory, shift_to_now=True):
+    """讀取替身數據；shift_to_now 時平移時間戳，使最後一根K線落在當前週期（讓緩存過期行為與線上一致）"""
+    from market_data import INTERVAL_MS
+    with open(os.path.join(directory, "exchangeInfo.json")) as f:
+        exchange_info = json.load(f)
+    klines = {}
+    now_ms = int(time.time() * 1000)
+    for name in os.listdir(os.path.join(directory, "klines")):
+        symbol, interval = name[:-len(".json")].rsplit("-", 1)
+        with open(os.path.join(directory, "klines", name)) as f:
+            rows = json.load(f)
+        if shift_to_now and rows and interval in INTERVAL_MS:
+            step = INTERVAL_MS[interval]
+            offset = now_ms // step * step - rows[-1][0]
+            for row in rows:
+                row[0] += offset
+                row[6] += offset
+        klines[(symbol, interval)] = rows
+    return exchange_info, klines
+
+
+# === Binance 替身伺服器 ===
+class StandInHandler(BaseHTTPRequestHandler):
+    """回放 /api/v3 的 exchangeInfo、klines、ticker/price（depth 為合成數據）；/__stats 返回請求計數，/__reset 歸零"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/__stats":
+            with server.lock:
+                return self._send(200, dict(server.counts))
+        if url.path == "/__reset":
+            with server.lock:
+                server.counts.clear()
+                server.window.clear()
+            return self._send(200, {})
+
+        endpoint = url.path.removeprefix("/api/v3/")
+        now = time.time()
+        with server.lock:
+            server.counts[endpoint] += 1
+            # 每分鐘請求數超過 rate_limit，或按 error_rate 隨機返回 429
+            while server.window and server.window[0] <= now - 60:
+                server.window.pop(0)
+            server.window.append(now)
+            limited = (server.rate_limit and len(server.window) > server.rate_limit) \
+                or server.rng.random() < server.error_rate
+            if limited:
+                server.counts['429'] += 1
+            delay = max(0.0, server.rng.gauss(server.latency, server.jitter))
+        time.sleep(delay)
+        if limited:
+            return self._send(429, {'code': -1003, 'msg': 'Too many requests.'}, {'Retry-After': '1'})
+
+        if endpoint == "exchangeInfo":
+            return self._send(200, server.exchange_info)
+        if endpoint == "klines":
+            rows = server.klines.get((params.get('symbol'), params.get('interval')))
+            if rows is None:
+                return self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+            if 'startTime' in params:
+                rows = [r for r in rows if r[0] >= int(params['startTime'])]
+            if 'endTime' in params:
+                rows = [r for r in rows if r[0] <= int(params['endTime'])]
+            limit = min(int(params.get('limit', 500)), FIXTURE_LIMIT)
+            return self._send(200, rows[:limit] if 'startTime' in params else rows[-limit:])
+        if endpoint == "ticker/price":
+            prices = server.last_prices
+            if 'symbol' in params:
+                if params['symbol'] not in prices:
+                    return self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+                return self._send(200, {'symbol': params['symbol'], 'price': prices[params['symbol']]})
+            return self._send(200, [{'symbol': s, 'price': p} for s, p in prices.items()])
+        if endpoint == "depth":
+            price = server.last_prices.get(params.get('symbol'))
+            if price is None:
+                return self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+            # 以最新價格為中心、每檔 0.01% 的合成訂單簿
+            limit = min(int(params.get('limit', 100)), 5000)
+            price = float(price)
+            offsets = np.arange(1, limit + 1) * price * 1e-4
+            qty = server.rng.random()
+            return self._send(200, {
+                'lastUpdateId': server.counts['depth'],
+                'bids': [[f"{price - d:.8f}", f"{qty * (1 + k % 7):.4f}"] for k, d in enumerate(offsets)],
+                'asks': [[f"{price + d:.8f}", f"{qty * (1 + k % 5):.4f}"] for k, d in enumerate(offsets)],
+            })
+        return self._send(404, {'code': -1, 'msg': 'Not found.'})
+
+
+def make_server(fixtures, port=0, latency=0.0, jitter=0.0, rate_limit=0, error_rate=0.0, seed=0):
+    """latency / jitter 單位為秒；rate_limit 為每分鐘請求上限（0 不限）；error_rate 為隨機 429 機率"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.daemon_threads = True
+    server.exchange_info, server.klines = load_fixtures(fixtures)
+    # 最新價格取各交易對最短週期的最後收盤（按週期長度降序，最短週期最後寫入）
+    from market_data import INTERVAL_MS
+    server.last_prices = {}
+    for (symbol, interval), rows in sorted(server.klines.items(), key=lambda item: -INTERVAL_MS[item[0][1]]):
+        if rows:
+            server.last_prices[symbol] = rows[-1][4]
+    server.latency, server.jitter = latency, jitter
+    server.rate_limit, server.error_rate = rate_limit, error_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.counts = Counter()
+    server.window = []
+    return server
+
+
+def _serve_process(ready, fixtures, kwargs):
+    server = make_server(fixtures, **kwargs)
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server_process(fixtures, **kwargs):
+    """在子進程啟動替身伺服器（不佔用被測進程的 CPU），返回 (process, base_url)"""
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_serve_process, args=(sender, fixtures, kwargs), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, f"http://127.0.0.1:{port}"
+
+
+def server_request(base_url, path):
+    import requests
+    return requests.get(f"{base_url}/{path}", timeout=10).json()
+
+
+# === 資源取樣 ===
+def current_rss():
+    """當前 RSS（位元組），無 /proc 時退回峰值 RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceSampler(threading.Thread):
+    """定期取樣 RSS，並記錄期間的 CPU 時間"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.interval = interval
+        self.rss = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.rss.append(current_rss())
+            self._stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self._cpu_start = os.times()
+        self._wall_start = time.perf_counter()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self.join()
+        cpu = os.times()
+        self.cpu_seconds = (cpu.user - self._cpu_start.user) + (cpu.system - self._cpu_start.system)
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.rss.append(current_rss())
+
+
+# === 無頭 session ===
+def symbol_weights(n, skew=1.1):
+    """交易對熱度呈 Zipf 分布：少數熱門交易對佔大多數訪問"""
+    weights = 1 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def run_session(seed, symbol_labels, periods, steps, think_time, timeout, results):
+    """
+    一個 session：首次載入後執行 steps 次切換（70% 換交易對、30% 換時間範圍）
+    每次 rerun 的 (耗時秒數, 是否出錯) 追加到 results
+    """
+    from streamlit.testing.v1 import AppTest
+    rng = np.random.default_rng(seed)
+    weights = symbol_weights(len(symbol_labels))
+
+    def rerun(at):
+        t0 = time.perf_counter()
+        try:
+            at.run(timeout=timeout)
+            failed = len(at.exception) > 0
+        except Exception:
+            failed = True
+        results.append((time.perf_counter() - t0, failed))
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    rerun(at)
+    for _ in range(steps):
+        if think_time:
+            time.sleep(rng.exponential(think_time))
+        boxes = {box.label: box for box in at.sidebar.selectbox}
+        if SYMBOL_LABEL not in boxes:
+            rerun(at)
+            continue
+        if rng.random() < 0.7:
+            boxes[SYMBOL_LABEL].set_value(symbol_labels[rng.choice(len(symbol_labels), p=weights)])
+        else:
+            boxes[PERIOD_LABEL].set_value(periods[rng.integers(len(periods))])
+        rerun(at)
+
+
+def run_level(n_sessions, symbol_labels, periods, steps, think_time, timeout, seed):
+    results = []
+    threads = [threading.Thread(target=run_session, name=f"session-{i}",
+                                args=(seed + i, symbol_labels, periods, steps, think_time, timeout, results))
+               for i in range(n_sessions)]
+    with ResourceSampler() as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results, sampler
+
+
+def summarize_level(n_sessions, results, sampler, upstream, coalescer):
+    latencies = np.array([dt for dt, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    return {
+        'sessions': n_sessions,
+        'reruns': len(results),
+        'errors': sum(failed for _, failed in results),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()) if len(latencies) else float('nan'),
+        'reruns_per_s': len(results) / sampler.wall_seconds,
+        'cpu_cores': sampler.cpu_seconds / sampler.wall_seconds,
+        'rss_start_mb': sampler.rss[0] / 2 ** 20,
+        'rss_peak_mb': max(sampler.rss) / 2 ** 20,
+        'rss_end_mb': sampler.rss[-1] / 2 ** 20,
+        'upstream': upstream,
+        'coalescer': coalescer,
+    }
+
+
+def print_report(row):
+    print(f"\n=== {row['sessions']} 個 session ===")
+    print(f"rerun {row['reruns']} 次（失敗 {row['errors']}），{row['reruns_per_s']:.1f} 次/秒")
+    print(f"延遲 p50 {row['p50_ms']:.0f} ms / p95 {row['p95_ms']:.0f} ms / "
+          f"p99 {row['p99_ms']:.0f} ms / max {row['max_ms']:.0f} ms")
+    print(f"CPU {row['cpu_cores']:.2f} 核，RSS {row['rss_start_mb']:.0f} -> {row['rss_end_mb']:.0f} MB"
+          f"（峰值 {row['rss_peak_mb']:.0f} MB）")
+    upstream = dict(row['upstream'])
+    throttled = upstream.pop('429', 0)
+    print(f"上游請求 {sum(upstream.values())} 次（429: {throttled}）: "
+          + ", ".join(f"{k} {v}" for k, v in sorted(upstream.items())))
+    print(f"進程內請求合併: 實際 {row['coalescer']['executed']} 次 / 合併 {row['coalescer']['coalesced']} 次")
+
+
+def run_loadtest(args):
+    process, base_url = start_server_process(
+        args.fixtures, latency=args.latency / 1000, jitter=args.jitter / 1000,
+        rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed)
+    # 必須在 app 的模組首次匯入前設定
+    os.environ["CRYMAP_BINANCE_API"] = f"{base_url}/api/v3"
+    from market_data import TIME_OPTIONS, REQUEST_COALESCER
+
+    exchange_info, _ = load_fixtures(args.fixtures, shift_to_now=False)
+    symbol_labels = [f"{s['baseAsset']} ({s['symbol']})" for s in exchange_info['symbols']]
+    periods = args.periods or list(TIME_OPTIONS)
+
+    report = []
+    try:
+        for n_sessions in args.sessions:
+            server_request(base_url, "__reset")
+            before = REQUEST_COALESCER.stats()
+            results, sampler = run_level(n_sessions, symbol_labels, periods, args.steps,
+                                         args.think_time, args.timeout, args.seed)
+            after = REQUEST_COALESCER.stats()
+            coalescer = {k: after[k] - before[k] for k in ('executed', 'coalesced')}
+            row = summarize_level(n_sessions, results, sampler, server_request(base_url, "__stats"), coalescer)
+            print_report(row)
+            report.append(row)
+    finally:
+        process.terminate()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="app.py 併發 session 壓測")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="錄製或生成替身數據")
+    rec.add_argument("--fixtures", default="fixtures")
+    rec.add_argument("--symbols", default="BTCUSDT,ETHUSDT,BNBUSDT,SOLUSDT,XRPUSDT")
+    rec.add_argument("--synthetic", type=int, default=0, help="離線生成 N 個隨機遊走交易對（不請求 API）")
+
+    def add_server_args(p):
+        p.add_argument("--fixtures", default="fixtures")
+        p.add_argument("--latency", type=float, default=50.0, help="每個請求的平均延遲 (ms)")
+        p.add_argument("--jitter", type=float, default=20.0, help="延遲標準差 (ms)")
+        p.add_argument("--rate-limit", type=int, default=0, help="每分鐘請求上限，超過返回 429（0 不限）")
+        p.add_argument("--error-rate", type=float, default=0.0, help="隨機返回 429 的機率")
+        p.add_argument("--seed", type=int, default=0)
+
+    srv = sub.add_parser("serve", help="單獨啟動替身伺服器")
+    add_server_args(srv)
+    srv.add_argument("--port", type=int, default=18080)
+
+    run = sub.add_parser("run", help="執行壓測")
+    add_server_args(run)
+    run.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 20])
+    run.add_argument("--steps", type=int, default=10, help="每個 session 的切換次數")
+    run.add_argument("--think-time", type=float, default=0.5, help="兩次操作之間的平均間隔秒數（指數分布）")
+    run.add_argument("--periods", nargs="+", default=None, help="限制可選的時間範圍")
+    run.add_argument("--timeout", type=float, default=120.0, help="單次 rerun 逾時秒數")
+    run.add_argument("--json", help="另存報告為 JSON")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.synthetic:
+            synthetic_fixtures(args.fixtures, args.synthetic)
+        else:
+            record_fixtures(args.fixtures, [s.strip().upper() for s in args.symbols.split(",") if s.strip()])
+        print(f"替身數據已寫入 {args.fixtures}")
+    elif args.command == "serve":
+        server = make_server(args.fixtures, port=args.port, latency=args.latency / 1000,
+                             jitter=args.jitter / 1000, rate_limit=args.rate_limit,
+                             error_rate=args.error_rate, seed=args.seed)
+        print(f"替身伺服器: http://127.0.0.1:{args.port}/api/v3")
+        server.serve_forever()
+    else:
+        run_loadtest(args)
@@ -0,0 +1,149 @@
+import os
+
+import requests
+import pandas as pd
+
+from singleflight import SingleFlight
+
+# Binance 行情數據存取（不依賴 streamlit，供 app.py 與其他模組共用）
+
+# 可用 CRYMAP_BINANCE_API 指向本地替身伺服器（見 loadtest.py）
+BINANCE_API = os.environ.get("CRYMAP_BINANCE_API", "https://api.binance.com/api/v3")
+
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+]
+NUMERIC_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume']
+
+# 時間範圍選擇: 顯示名稱 -> (K線週期, 筆數)
+TIME_OPTIONS = {
+    "1天": ("3m", 480),
+    "3天": ("15m", 288),
+    "7天": ("15m", 672),
+    "14天": ("1h", 336),
+    "30天": ("4h", 180),
+    "90天": ("6h", 360),
+    "180天": ("1d", 180),
+    "1年": ("1d", 365),
+    "2年": ("1d", 730),
+    "3年": ("3d", 365),
+    "5年": ("1w", 260),
+}
+
+# K線週期長度（毫秒）
+_MINUTE_MS = 60 * 1000
+INTERVAL_MS = {
+    '1m': _MINUTE_MS, '3m': 3 * _MINUTE_MS, '5m': 5 * _MINUTE_MS,
+    '15m': 15 * _MINUTE_MS, '30m': 30 * _MINUTE_MS,
+    '1h': 60 * _MINUTE_MS, '2h': 120 * _MINUTE_MS, '4h': 240 * _MINUTE_MS,
+    '6h': 360 * _MINUTE_MS, '8h': 480 * _MINUTE_MS, '12h': 720 * _MINUTE_MS,
+    '1d': 1440 * _MINUTE_MS, '3d': 3 * 1440 * _MINUTE_MS, '1w': 7 * 1440 * _MINUTE_MS,
+}
+
+# 併發的相同請求 (endpoint, params) 只發出一次 HTTP 調用
+REQUEST_COALESCER = SingleFlight()
+
+
+def _request_json(endpoint, params, timeout):
+    response = requests.get(f"{BINANCE_API}/{endpoint}", params=params, timeout=timeout)
+    return response.json()
+
+
+def get_json(endpoint, params=None, timeout=10):
+    """
+    調用 Binance 公開 API 並返回解析後的 JSON
+    進行中的相同請求會被合併，共用同一個結果（調用方不可修改返回值）
+    """
+    params = params or {}
+    key = (endpoint, tuple(sorted(params.items())))
+    return REQUEST_COALESCER.do(key, _request_json, endpoint, params, timeout)
+
+
+def klines_to_dataframe(data):
+    """將 Binance K線原始列表轉換為以 datetime 為索引的 DataFrame"""
+    df = pd.DataFrame(data, columns=KLINE_COLUMNS)
+
+    # 數據類型轉換
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col])
+
+    # 時間戳轉換
+    df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
+    df.set_index('datetime', inplace=True)
+    return df
+
+
+def fetch_klines(symbol, interval, limit=1000, timeout=10):
+    """
+    獲取 Binance K線數據
+    interval: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d, 3d, 1w, 1M
+    API 返回錯誤時拋出 ValueError
+    """
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'limit': limit
+    }
+    data = get_json("klines", params, timeout)
+    if not isinstance(data, list):
+        raise ValueError(f"API 返回錯誤: {data}")
+    return klines_to_dataframe(data)
+
+
+def fetch_klines_range(symbol, interval, start_ms, end_ms=None, timeout=10):
+    """
+    分頁獲取 [start_ms, end_ms) 區間的K線（每頁最多1000根）
+    API 返回錯誤時拋出 ValueError
+    """
+    rows = []
+    cursor = start_ms
+    while True:
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': cursor,
+            'limit': 1000
+        }
+        if end_ms is not None:
+            params['endTime'] = end_ms - 1
+        data = get_json("klines", params, timeout)
+        if not isinstance(data, list):
+            raise ValueError(f"API 返回錯誤: {data}")
+        rows.extend(data)
+        if len(data) < 1000:
+            break
+        cursor = data[-1][0] + 1
+    return klines_to_dataframe(rows)
+
+
+def fetch_current_price(symbol, timeout=10):
+    """獲取當前價格，失敗時返回 None"""
+    try:
+        data = get_json("ticker/price", {'symbol': symbol}, timeout)
+        return float(data['price'])
+    except Exception:
+        return None
+
+
+def fetch_all_prices(timeout=10):
+    """一次獲取所有交易對的最新價格，返回 {symbol: price}，API 返回錯誤時拋出 ValueError"""
+    data = get_json("ticker/price", None, timeout)
+    if not isinstance(data, list):
+        raise ValueError(f"API 返回錯誤: {data}")
+    return {item['symbol']: float(item['price']) for item in data}
+
+
+def fetch_closes(symbols, interval, limit=1000):
+    """
+    獲取多個交易對的收盤價
+    返回 {symbol: close Series}，獲取失敗的交易對會被略過
+    """
+    closes = {}
+    for symbol in symbols:
+        try:
+            closes[symbol] = fetch_klines(symbol, interval, limit)['close']
+        except Exception:
+            continue
+    return closes
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from market_data import get_json
+
+try:
+    import aiohttp
+    STREAM_AVAILABLE = True
+except ImportError:  # aiohttp 為可選依賴
+    STREAM_AVAILABLE = False
+
+# 訂單簿深度熱圖
+# 每個快照的買賣掛單以一次 bincount 分箱到價格網格，
+# 寫入預先分配的 (時間 × 價格) 環形緩衝區，更新只覆蓋一行，不重新分配或搬移數據
+# 熱圖網格由 KDE 網格向兩端擴展並把點距量化為 1-2-5 系列：KDE 範圍在擴展區內移動時沿用原網格，
+# 超出時把已有的快照重新分箱到新網格（熱圖物件與串流保持不變）
+# 可選的 diff-depth 串流（需要 aiohttp，瀏覽器環境不可用）在背景維護本地訂單簿並定期取樣
+
+logger = logging.getLogger(__name__)
+
+BINANCE_STREAM = os.environ.get("CRYMAP_BINANCE_STREAM", "wss://stream.binance.com:9443/ws")
+# 熱圖網格兩端各擴展 KDE 範圍的比例，以及點數相對 KDE 網格的倍數
+HEATMAP_PADDING = 0.25
+HEATMAP_RESOLUTION = 2
+
+
+def fetch_depth(symbol, limit=1000, timeout=10):
+    """
+    獲取訂單簿快照，返回 (lastUpdateId, bids, asks)，bids / asks 為 (n, 2) 的 [價格, 數量]
+    API 返回錯誤時拋出 ValueError
+    """
+    data = get_json("depth", {'symbol': symbol, 'limit': limit}, timeout)
+    if not isinstance(data, dict) or 'bids' not in data:
+        raise ValueError(f"API 返回錯誤: {data}")
+    bids = np.asarray(data['bids'], dtype=np.float64).reshape(-1, 2)
+    asks = np.asarray(data['asks'], dtype=np.float64).reshape(-1, 2)
+    return data['lastUpdateId'], bids, asks
+
+
+def bin_levels(levels, grid):
+    """
+    將 [價格, 數量] 掛單累加到等距價格網格（每個網格點為其所在箱的中心）
+    網格範圍外的掛單忽略，返回長度 len(grid) 的各箱數量
+    """
+    if len(levels) == 0 or len(grid) < 2:
+        return np.zeros(len(grid))
+    step = (grid[-1] - grid[0]) / (len(grid) - 1)
+    idx = np.floor((levels[:, 0] - grid[0]) / step + 0.5).astype(np.int64)
+    inside = (idx >= 0) & (idx < len(grid))
+    return np.bincount(idx[inside], weights=levels[inside, 1], minlength=len(grid))
+
+
+def nice_step(step):
+    """不小於 step 的 1-2-5 系列點距（1, 2, 5, 10, 20, ...）× 10^k"""
+    scale = 10.0 ** np.floor(np.log10(step))
+    for mantissa in (1, 2, 5, 10):
+        if mantissa * scale >= step * (1 - 1e-9):
+            return mantissa * scale
+
+
+def heatmap_grid(grid, padding=HEATMAP_PADDING, resolution=HEATMAP_RESOLUTION):
+    """由 KDE 網格得到熱圖網格：範圍兩端各擴展 padding 倍，點距量化後對齊到點距的整數倍"""
+    lo, hi = float(grid[0]), float(grid[-1])
+    span = hi - lo if hi > lo else abs(lo) or 1.0
+    step = nice_step(span * (1 + 2 * padding) / (resolution * max(len(grid) - 1, 1)))
+    start = np.floor((lo - padding * span) / step)
+    stop = np.ceil((hi + padding * span) / step)
+    return (start + np.arange(int(stop - start) + 1)) * step
+
+
+class DepthHeatmap:
+    """
+    固定價格網格上的滾動深度矩陣（最多 capacity 個快照）
+    相隔不足 min_interval 秒的快照會被略過，多個 session 同時刷新也只記錄一次
+    """
+
+    def __init__(self, grid, capacity=240, min_interval=5.0):
+        self.grid = np.array(grid, dtype=np.float64)
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self.bids = np.zeros((capacity, len(self.grid)), dtype=np.float32)
+        self.asks = np.zeros((capacity, len(self.grid)), dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.int64)  # 毫秒
+        self.head = 0   # 下一個寫入的行
+        self.count = 0
+        self.version = 0
+        self.last_viewed = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def step(self):
+        return (self.grid[-1] - self.grid[0]) / (len(self.grid) - 1)
+
+    def covers(self, grid, step):
+        """KDE 網格 grid 落在熱圖網格內、且熱圖點距等於 step 時可沿用"""
+        return np.isclose(self.step, step) and self.grid[0] <= grid[0] and grid[-1] <= self.grid[-1]
+
+    def regrid(self, grid):
+        """換用新網格，已有的快照按價格重新分箱（點距相同時只是平移）"""
+        grid = np.array(grid, dtype=np.float64)
+        with self._lock:
+            step = (grid[-1] - grid[0]) / (len(grid) - 1)
+            idx = np.floor((self.grid - grid[0]) / step + 0.5).astype(np.int64)
+            inside = (idx >= 0) & (idx < len(grid))
+            for name in ('bids', 'asks'):
+                old = getattr(self, name)
+                new = np.zeros((self.capacity, len(grid)), dtype=np.float32)
+                np.add.at(new.T, idx[inside], old.T[inside])
+                setattr(self, name, new)
+            self.grid = grid
+            self.version += 1
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return self.count == 0 or now * 1000 - self.times[(self.head - 1) % self.capacity] >= self.min_interval * 1000
+
+    def stale(self, factor=3, now=None):
+        """超過 factor 個取樣間隔沒有新快照（例如串流斷線）"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self.count == 0 or now * 1000 - self.times[(self.head - 1) % self.capacity] >= factor * self.min_interval * 1000
+
+    def add_snapshot(self, bids, asks, timestamp=None):
+        """寫入一個快照（timestamp 為毫秒），被節流略過時返回 False"""
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        with self._lock:
+            if self.count and timestamp - self.times[(self.head - 1) % self.capacity] < self.min_interval * 1000:
+                return False
+            # 在鎖內分箱，避免與 regrid 交錯時寫入舊網格的結果
+            self.bids[self.head] = bin_levels(bids, self.grid)
+            self.asks[self.head] = bin_levels(asks, self.grid)
+            self.times[self.head] = timestamp
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.version += 1
+        return True
+
+    def matrix(self):
+        """按時間排序的 (times, bids, asks)，bids / asks 形狀為 (快照數, 網格點數)"""
+        with self._lock:
+            self.last_viewed = time.time()
+            order = (self.head - self.count + np.arange(self.count)) % self.capacity
+            return self.times[order], self.bids[order], self.asks[order]
+
+
+class DepthHeatmapRegistry:
+    """進程內按交易對共用的熱圖（LRU，最多 max_symbols 個），KDE 網格超出熱圖網格時重新分箱"""
+
+    def __init__(self, max_symbols=10, **heatmap_kwargs):
+        self.max_symbols = max_symbols
+        self.heatmap_kwargs = heatmap_kwargs
+        self._lock = threading.Lock()
+        self._heatmaps = OrderedDict()
+        self._streams = {}
+
+    def get(self, symbol, grid):
+        with self._lock:
+            heatmap = self._heatmaps.get(symbol)
+            target = heatmap_grid(grid)
+            if heatmap is None:
+                heatmap = DepthHeatmap(target, **self.heatmap_kwargs)
+                self._heatmaps[symbol] = heatmap
+            elif not heatmap.covers(grid, target[1] - target[0]):
+                heatmap.regrid(target)
+            self._heatmaps.move_to_end(symbol)
+            while len(self._heatmaps) > self.max_symbols:
+                evicted, _ = self._heatmaps.popitem(last=False)
+                self._stop_stream(evicted)
+            return heatmap
+
+    def _stop_stream(self, symbol):
+        stream = self._streams.pop(symbol, None)
+        if stream is not None:
+            stream.stop()
+
+    def ensure_stream(self, symbol, heatmap):
+        """為熱圖啟動 diff-depth 串流，環境不支援時返回 None（調用方改用 REST 快照）"""
+        if sys.platform == "emscripten" or not STREAM_AVAILABLE:
+            return None
+        with self._lock:
+            stream = self._streams.get(symbol)
+            if stream is None or not stream.is_alive() or stream.heatmap is not heatmap:
+                stream = DepthStreamWorker(symbol, heatmap)
+                stream.start()
+                self._streams[symbol] = stream
+            return stream
+
+
+DEPTH_HEATMAPS = DepthHeatmapRegistry()
+
+
+def refresh_heatmap(symbol, heatmap, limit=1000):
+    """以 REST 快照更新熱圖（未到取樣時間時不請求）"""
+    if heatmap.due():
+        _, bids, asks = fetch_depth(symbol, limit)
+        heatmap.add_snapshot(bids, asks)
+    return heatmap
+
+
+# === diff-depth 串流 ===
+class OrderBookGap(Exception):
+    """串流事件不連續，需要重新取得快照"""
+
+
+class LocalOrderBook:
+    """按 Binance 文件的規則以 diff-depth 事件維護的本地訂單簿"""
+
+    def __init__(self, last_update_id, bids, asks):
+        self.last_update_id = last_update_id
+        self.bids = {float(p): float(q) for p, q in bids}
+        self.asks = {float(p): float(q) for p, q in asks}
+
+    def apply(self, event):
+        """套用一個 depthUpdate 事件（U 首個、u 最後一個更新 ID）；已過時的事件略過"""
+        first, last = event['U'], event['u']
+        if last <= self.last_update_id:
+            return False
+        # 首個事件需滿足 U <= lastUpdateId + 1 <= u，之後每個事件的 U 需緊接上一個 u
+        if first > self.last_update_id + 1:
+            raise OrderBookGap(f"預期 {self.last_update_id + 1}，收到 {first}")
+        for side, updates in ((self.bids, event['b']), (self.asks, event['a'])):
+            for price, qty in updates:
+                price, qty = float(price), float(qty)
+                if qty == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = qty
+        self.last_update_id = last
+        return True
+
+    def levels(self):
+        bids = np.array(list(self.bids.items()), dtype=np.float64).reshape(-1, 2)
+        asks = np.array(list(self.asks.items()), dtype=np.float64).reshape(-1, 2)
+        return bids, asks
+
+
+class DepthStreamWorker(threading.Thread):
+    """
+    訂閱 {symbol}@depth@100ms，每 heatmap.min_interval 秒把本地訂單簿寫入熱圖
+    熱圖超過 idle_timeout 秒無人查看時自動結束；每次斷線（含正常關閉）後等待 retry_delay 秒再重連
+    """
+
+    def __init__(self, symbol, heatmap, limit=1000, idle_timeout=600, retry_delay=5.0):
+        super().__init__(name=f"depth-{symbol}", daemon=True)
+        self.symbol = symbol
+        self.heatmap = heatmap
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+        self.retry_delay = retry_delay
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set() or time.time() - self.heatmap.last_viewed > self.idle_timeout
+
+    def run(self):
+        while not self.stopped():
+            try:
+                asyncio.run(self._stream())
+            except OrderBookGap as e:
+                # 事件不連續是串流的正常現象，重新取快照即可
+                logger.info("%s 深度串流事件不連續，重新同步: %s", self.symbol, e)
+            except Exception as e:
+                logger.warning("%s 深度串流中斷: %s", self.symbol, e)
+            self._stop_event.wait(self.retry_delay)
+
+    async def _stream(self):
+        url = f"{BINANCE_STREAM}/{self.symbol.lower()}@depth@100ms"
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url, heartbeat=30) as ws:
+                # 先開始接收事件，再取快照；快照之前的事件由 LocalOrderBook 略過
+                pending = []
+                book = None
+                loop = asyncio.get_running_loop()
+                snapshot = loop.run_in_executor(None, fetch_depth, self.symbol, self.limit)
+                async for msg in ws:
+                    if self.stopped():
+                        return
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    event = json.loads(msg.data)
+                    if book is None:
+                        pending.append(event)
+                        if not snapshot.done():
+                            continue
+                        book = LocalOrderBook(*snapshot.result())
+                        events, pending = pending, []
+                    else:
+                        events = [event]
+                    for e in events:
+                        book.apply(e)
+                    if self.heatmap.due():
+                        self.heatmap.add_snapshot(*book.levels(), timestamp=event.get('E'))
@@ -0,0 +1,109 @@
+import logging
+import sys
+import threading
+import time
+
+from market_data import TIME_OPTIONS
+from kline_store import fetch_klines_stored
+from analysis import summarize
+from kline_cache import KLINE_CACHE
+
+# 背景預取：每個 streamlit 進程啟動一次，讓熱門交易對在所有時間範圍下保持溫緩存，
+# 於K線收盤後立即刷新，首位訪問者不必等待 API
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYMBOLS = ("BTCUSDT", "ETHUSDT")
+
+
+class PrefetchWorker(threading.Thread):
+    """
+    定期刷新前 top_n 個熱門交易對的K線與衍生統計
+    熱度來自 KlineCache 記錄的訪問次數，default_symbols 永遠包含在內
+    """
+
+    def __init__(self, cache=KLINE_CACHE, time_options=TIME_OPTIONS, top_n=20,
+                 default_symbols=DEFAULT_SYMBOLS, refresh_delay=2.0,
+                 retry_delay=30.0, poll_interval=5.0, fetch=fetch_klines_stored):
+        super().__init__(name="kline-prefetch", daemon=True)
+        self.cache = cache
+        self.periods = sorted(set(time_options.values()))
+        self.top_n = top_n
+        self.default_symbols = tuple(default_symbols)
+        self.refresh_delay = refresh_delay  # 收盤後延遲秒數，等待交易所落地最後一根K線
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval  # 最長休眠時間，以便及時納入新的熱門交易對
+        self.fetch = fetch
+        self._retry_at = {}
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def symbols(self, now=None):
+        """本輪需保持溫緩存的交易對（依優先順序）"""
+        ranked = list(self.default_symbols)
+        for symbol in self.cache.top_symbols(self.top_n, now):
+            if symbol not in ranked:
+                ranked.append(symbol)
+        return ranked[:max(self.top_n, len(self.default_symbols))]
+
+    def due_at(self, symbol, interval, limit):
+        entry = self.cache.peek(symbol, interval, limit)
+        if entry is not None:
+            due = entry['expires_at'] + self.refresh_delay
+        else:
+            # 因記憶體預算被淘汰的項按原失效時間刷新，避免與淘汰互相追逐
+            evicted = self.cache.evicted_expiry(symbol, interval, limit)
+            due = 0.0 if evicted is None else evicted + self.refresh_delay
+        return max(due, self._retry_at.get((symbol, interval, limit), 0.0))
+
+    def refresh(self, symbol, interval, limit, now=None):
+        """抓取並計算一組K線，失敗時在 retry_delay 後重試"""
+        key = (symbol, interval, limit)
+        try:
+            df = self.fetch(symbol, interval, limit)
+            self.cache.put(symbol, interval, limit, df, summarize(df, interval), now)
+            self._retry_at.pop(key, None)
+        except Exception as e:
+            logger.warning("預取 %s %s 失敗: %s", symbol, interval, e)
+            self._retry_at[key] = (time.time() if now is None else now) + self.retry_delay
+
+    def run_once(self, now=None):
+        """刷新所有已到期的項目，返回下一個到期時間"""
+        now = time.time() if now is None else now
+        next_due = now + self.poll_interval
+        for symbol in self.symbols(now):
+            for interval, limit in self.periods:
+                if self._stop_event.is_set():
+                    return next_due
+                due = self.due_at(symbol, interval, limit)
+                if due <= now:
+                    self.refresh(symbol, interval, limit)
+                    due = self.due_at(symbol, interval, limit)
+                next_due = min(next_due, due)
+        return next_due
+
+    def run(self):
+        while not self._stop_event.is_set():
+            next_due = self.run_once()
+            self._stop_event.wait(max(0.5, next_due - time.time()))
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_prefetch_worker(**kwargs):
+    """
+    啟動進程唯一的背景預取工作（重複調用無副作用）
+    瀏覽器 (stlite/Pyodide) 環境不支援執行緒，直接返回 None
+    """
+    global _worker
+    if sys.platform == "emscripten":
+        return None
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = PrefetchWorker(**kwargs)
+            _worker.start()
+        return _worker
@@ -0,0 +1,150 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# 區塊自助法 (block bootstrap) 價格路徑模擬
+# 從歷史報酬率中成塊重抽樣（保留短期自相關與波動聚集），以一次批量的 NumPy 索引產生整批路徑；
+# 路徑分塊生成，只累積每期、路徑最高點與最低點的直方圖，記憶體用量與總路徑數無關
+# 模擬只在累積對數報酬率上進行（與當前價格無關，可按 (報酬率, 期數) 緩存），
+# 價格區間與價位觸及機率由 price_bands 以當前價格換算
+
+
+def default_block_size(n_returns):
+    """常用的 T^(1/3) 區塊長度"""
+    return max(1, int(round(n_returns ** (1 / 3))))
+
+
+def bootstrap_chunk(log_returns, horizon, n_paths, block_size, rng):
+    """
+    產生一批累積對數報酬率路徑，形狀 (n_paths, horizon)
+    每條路徑由 ceil(horizon / block_size) 個隨機起點的連續區塊拼接而成
+    """
+    n_blocks = -(-horizon // block_size)
+    starts = rng.integers(0, len(log_returns) - block_size + 1, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :horizon]
+    return np.cumsum(log_returns[idx], axis=1)
+
+
+def _simulate_worker(args):
+    """模擬 n_paths 條路徑並返回可合併的部分結果 (每期直方圖, 路徑最高點直方圖, 路徑最低點直方圖)"""
+    log_returns, horizon, n_paths, block_size, chunk_size, edges, seed = args
+    rng = np.random.default_rng(seed)
+    n_bins = len(edges) - 1
+    hist = np.zeros((horizon, n_bins), dtype=np.int64)
+    max_hist = np.zeros(n_bins, dtype=np.int64)
+    min_hist = np.zeros(n_bins, dtype=np.int64)
+    step_offsets = np.arange(horizon)[:, None] * n_bins
+
+    def bin_of(values):
+        return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, n_bins - 1)
+
+    done = 0
+    while done < n_paths:
+        size = min(chunk_size, n_paths - done)
+        paths = bootstrap_chunk(log_returns, horizon, size, block_size, rng)
+
+        # 每一期的分布直方圖（所有期一次 bincount）
+        bins = bin_of(paths)
+        hist += np.bincount((bins.T + step_offsets).ravel(), minlength=horizon * n_bins).reshape(horizon, n_bins)
+        # 觸及：價位在上方看路徑最高點，在下方看最低點（含起點 0）
+        max_hist += np.bincount(bin_of(paths.max(axis=1, initial=0.0)), minlength=n_bins)
+        min_hist += np.bincount(bin_of(paths.min(axis=1, initial=0.0)), minlength=n_bins)
+        done += size
+    return hist, max_hist, min_hist
+
+
+def _hist_quantiles(hist, edges, qs):
+    """由每期直方圖插值出分位數，返回 (horizon, len(qs))"""
+    cdf = np.cumsum(hist, axis=1) / hist.sum(axis=1, keepdims=True)
+    cdf = np.concatenate([np.zeros((len(hist), 1)), cdf], axis=1)
+    return np.array([np.interp(qs, row, edges) for row in cdf])
+
+
+def _hist_cdf(hist, edges, x):
+    """直方圖在 x 處的累積比例（箱內線性插值）"""
+    cdf = np.concatenate([[0.0], np.cumsum(hist) / hist.sum()])
+    return np.interp(x, edges, cdf)
+
+
+def simulate_log_paths(returns, horizon=5, n_paths=100_000, block_size=None,
+                       chunk_size=20_000, n_bins=2000, processes=None, seed=None):
+    """
+    以歷史報酬率做區塊自助法模擬累積對數報酬率（與價格無關）
+    returns: 每期的簡單報酬率（如 analysis.volatility_returns 的結果）
+    processes: 大於 1 時把路徑分給多個進程
+    返回 dict(edges, hist, max_hist, min_hist, n_paths, block_size)，報酬率不足時返回 None
+    """
+    log_returns = np.log1p(np.asarray(returns, dtype=np.float64))
+    log_returns = log_returns[np.isfinite(log_returns)]
+    if len(log_returns) < 2:
+        return None
+    block_size = block_size or default_block_size(len(log_returns))
+    block_size = min(block_size, len(log_returns))
+
+    # 直方圖範圍：horizon 期內累積報酬的理論極值
+    reach = horizon * np.abs(log_returns).max() + 1e-12
+    edges = np.linspace(-reach, reach, n_bins + 1)
+
+    seeds = np.random.SeedSequence(seed)
+    n_workers = max(1, processes or 1)
+    shares = [n_paths // n_workers + (i < n_paths % n_workers) for i in range(n_workers)]
+    jobs = [(log_returns, horizon, share, block_size, chunk_size, edges, child)
+            for share, child in zip(shares, seeds.spawn(n_workers)) if share > 0]
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            parts = list(pool.map(_simulate_worker, jobs))
+    else:
+        parts = [_simulate_worker(job) for job in jobs]
+
+    return {
+        'edges': edges,
+        'hist': sum(p[0] for p in parts),
+        'max_hist': sum(p[1] for p in parts),
+        'min_hist': sum(p[2] for p in parts),
+        'n_paths': n_paths,
+        'block_size': block_size,
+    }
+
+
+def price_bands(simulation, price, levels=(), quantiles=(0.025, 0.16, 0.5, 0.84, 0.975)):
+    """
+    把 simulate_log_paths 的結果換算為當前價格下的區間（計算量只與直方圖大小有關）
+    levels: 需要計算觸及機率的價位（如 KDE 支撐 / 阻力位）
+    返回 dict：
+      bands: (horizon, len(quantiles)) 每期的價格分位數
+      terminal_quantiles: 期末價格的分位數
+      hit_prob: 各價位在 horizon 期內被觸及的機率（依收盤價路徑）
+      prob_up: 期末高於當前價格的機率
+    """
+    edges, hist = simulation['edges'], simulation['hist']
+    levels = np.asarray(levels, dtype=np.float64)
+    qs = np.asarray(quantiles)
+    bands = price * np.exp(_hist_quantiles(hist, edges, qs))
+    if len(levels):
+        level_logs = np.log(levels / price)
+        hit_prob = np.where(level_logs > 0,
+                            1 - _hist_cdf(simulation['max_hist'], edges, level_logs),
+                            _hist_cdf(simulation['min_hist'], edges, level_logs))
+        # 價位恰為當前價格（或在另一側的邊界上）時必定觸及
+        hit_prob = np.where(level_logs == 0, 1.0, hit_prob)
+    else:
+        hit_prob = np.empty(0)
+    return {
+        'quantiles': qs,
+        'bands': bands,
+        'terminal_quantiles': bands[-1],
+        'hit_prob': hit_prob,
+        'levels': levels,
+        'prob_up': float(1 - _hist_cdf(hist[-1], edges, 0.0)),
+        'n_paths': simulation['n_paths'],
+        'block_size': simulation['block_size'],
+    }
+
+
+def simulate_price_paths(returns, price, horizon=5, n_paths=100_000, block_size=None,
+                         levels=(), quantiles=(0.025, 0.16, 0.5, 0.84, 0.975),
+                         chunk_size=20_000, n_bins=2000, processes=None, seed=None):
+    """模擬並換算為價格區間（simulate_log_paths + price_bands），報酬率不足時返回 None"""
+    simulation = simulate_log_paths(returns, horizon, n_paths, block_size, chunk_size, n_bins, processes, seed)
+    if simulation is None:
+        return None
+    return price_bands(simulation, price, levels, quantiles)
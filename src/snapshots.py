@@ -0,0 +1,211 @@
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import requests
+
+from market_data import INTERVAL_MS, TIME_OPTIONS, fetch_klines_range
+from analysis import distribution_model, price_distribution, summarize
+from kline_cache import COMPACT_COLUMNS, compact_klines
+from kline_store import fetch_klines_stored
+
+# 預先計算的靜態快照（供 gh-pages 的瀏覽器版使用）
+# build_snapshots.py 於部署前為 coin_list.json 的每個交易對寫出一個分片 {symbol}.npz：
+#   "{interval}/{欄位}"      各週期最長時間範圍的精簡K線（同 compact_klines，不含 close_time；open_time 差分保存）
+#   "{interval}_{limit}/…"   每個時間範圍的 KDE 曲線（相對峰值量化為 uint16）、網格範圍、峰谷索引與最後一根K線的時間
+# 以及 manifest.json（版本、建置時間、各交易對的分片建置時間）
+# 分片由排程（.github/workflows/snapshots.yml）定期重建；1天 / 3天 這類短時間範圍在兩次重建之間就會過時，不寫入分片
+# 瀏覽器先載入分片，只向 API 請求快照之後的K線；新增K線不多時直接沿用分片中的 KDE 與支撐阻力位
+
+SNAPSHOT_VERSION = 2  # 2: 3d / 1w 改用K線內成交量分布
+MANIFEST_NAME = "manifest.json"
+# KDE 曲線的量化級數（相對誤差約 1e-5，圖上無法分辨）
+KDE_LEVELS = np.iinfo(np.uint16).max
+# 快照之後新增的已收盤K線不超過時間範圍的這個比例時，沿用快照的價格分布
+REUSE_FRACTION = 0.02
+# 時間範圍不超過這個長度（毫秒）的不寫入分片
+SHORT_PERIOD_MS = 3 * 24 * 60 * 60 * 1000
+SNAPSHOT_PERIODS = {name: (interval, limit) for name, (interval, limit) in TIME_OPTIONS.items()
+                    if limit * INTERVAL_MS[interval] > SHORT_PERIOD_MS}
+
+
+def period_key(interval, limit):
+    return f"{interval}_{limit}"
+
+
+def snapshot_intervals(periods=SNAPSHOT_PERIODS):
+    """各K線週期需要保存的最長K線數，如 15m 供 3天 / 7天 共用 672 根"""
+    intervals = {}
+    for interval, limit in periods.values():
+        intervals[interval] = max(limit, intervals.get(interval, 0))
+    return intervals
+
+
+def build_shard(frames, periods=SNAPSHOT_PERIODS):
+    """
+    frames: {interval: 該週期最近的K線 DataFrame}
+    返回分片的 npz 位元組；數據點不足以計算價格分布的時間範圍只保存K線
+    """
+    arrays = {}
+    for interval, df in frames.items():
+        compact = compact_klines(df)
+        for col in COMPACT_COLUMNS[1:-1]:
+            arrays[f"{interval}/{col}"] = compact[col].to_numpy()
+        # 間距固定的時間戳差分後幾乎完全可壓縮
+        arrays[f"{interval}/open_time"] = np.diff(compact['open_time'].to_numpy(), prepend=0)
+    for interval, limit in periods.values():
+        df = frames.get(interval)
+        if df is None or df.empty:
+            continue
+        df = df.iloc[-limit:]
+        distribution = price_distribution(df, model=distribution_model(interval))
+        if distribution is None:
+            continue
+        key = period_key(interval, limit)
+        x_vals = distribution['x_vals']
+        kde_vals = distribution['kde_vals']
+        scale = kde_vals.max()
+        arrays[f"{key}/x_range"] = np.array([x_vals[0], x_vals[-1], len(x_vals), scale], dtype=np.float64)
+        arrays[f"{key}/kde"] = np.round(kde_vals / scale * KDE_LEVELS).astype(np.uint16)
+        arrays[f"{key}/peaks"] = np.asarray(distribution['peaks'], dtype=np.int32)
+        arrays[f"{key}/troughs"] = np.asarray(distribution['troughs'], dtype=np.int32)
+        arrays[f"{key}/last_open_time"] = np.array(df['open_time'].iloc[-1], dtype=np.int64)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+class Snapshot:
+    """一個交易對的分片"""
+
+    def __init__(self, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            self.arrays = {name: npz[name] for name in npz.files}
+
+    def klines(self, interval):
+        """該週期的精簡K線 DataFrame（格式同 compact_klines），分片中沒有時返回 None"""
+        open_time = self.arrays.get(f"{interval}/open_time")
+        if open_time is None or interval not in INTERVAL_MS:
+            return None
+        open_time = np.cumsum(open_time)
+        data = {'open_time': open_time}
+        data.update({col: self.arrays[f"{interval}/{col}"] for col in COMPACT_COLUMNS[1:-1]})
+        data['close_time'] = open_time + INTERVAL_MS[interval] - 1
+        return pd.DataFrame(data, index=pd.to_datetime(open_time, unit='ms').rename('datetime'))
+
+    def distribution(self, interval, limit):
+        """返回 (last_open_time, price_distribution 格式的 dict)，分片中沒有時返回 None"""
+        key = period_key(interval, limit)
+        if f"{key}/kde" not in self.arrays:
+            return None
+        lo, hi, n, scale = self.arrays[f"{key}/x_range"]
+        return int(self.arrays[f"{key}/last_open_time"]), {
+            'x_vals': np.linspace(lo, hi, int(n)),
+            'kde_vals': self.arrays[f"{key}/kde"] * (scale / KDE_LEVELS),
+            'peaks': self.arrays[f"{key}/peaks"].astype(np.intp),
+            'troughs': self.arrays[f"{key}/troughs"].astype(np.intp),
+        }
+
+
+def _snapshot_base():
+    """快照位置：CRYMAP_SNAPSHOTS（目錄或 URL），或瀏覽器版 index.html 寫入的 snapshot_config.json"""
+    base = os.environ.get('CRYMAP_SNAPSHOTS')
+    if base:
+        return base
+    try:
+        with open('snapshot_config.json', 'r') as file:
+            return json.load(file).get('base')
+    except (OSError, ValueError):
+        return None
+
+
+class SnapshotSource:
+    """讀取目錄或 URL 下的 manifest 與分片（分片以 LRU 保留最近 max_shards 個）"""
+
+    def __init__(self, base, max_shards=8, timeout=10):
+        self.base = base
+        self.max_shards = max_shards
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._shards = OrderedDict()
+        self._manifest = None
+
+    def _read(self, name):
+        """讀取文件內容，不存在時返回 None"""
+        if self.base.startswith(('http://', 'https://')):
+            response = requests.get(self.base.rstrip('/') + '/' + name, timeout=self.timeout)
+            return response.content if response.status_code == 200 else None
+        try:
+            with open(os.path.join(self.base, name), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def manifest(self):
+        if self._manifest is None:
+            data = self._read(MANIFEST_NAME)
+            manifest = json.loads(data) if data else {}
+            self._manifest = manifest if manifest.get('version') == SNAPSHOT_VERSION else {'symbols': {}}
+        return self._manifest
+
+    def shard(self, symbol):
+        """交易對的 Snapshot，不在 manifest 中時返回 None"""
+        with self._lock:
+            if symbol in self._shards:
+                self._shards.move_to_end(symbol)
+                return self._shards[symbol]
+        if symbol not in self.manifest().get('symbols', {}):
+            return None
+        data = self._read(f"{symbol}.npz")
+        shard = Snapshot(data) if data else None
+        with self._lock:
+            self._shards[symbol] = shard
+            while len(self._shards) > self.max_shards:
+                self._shards.popitem(last=False)
+        return shard
+
+
+_base = _snapshot_base()
+SNAPSHOTS = SnapshotSource(_base) if _base else None
+
+
+def fetch_klines_snapshot(symbol, interval, limit, source=None):
+    """
+    與 fetch_klines_stored 相同介面：快照優先，只向 API 請求快照最後一根（建置時可能未收盤）之後的K線
+    沒有快照、或快照之後的缺口大於 limit 時，等同 fetch_klines_stored
+    """
+    source = source or SNAPSHOTS
+    shard = source.shard(symbol) if source is not None else None
+    head = shard.klines(interval) if shard is not None else None
+    if head is None or head.empty:
+        return fetch_klines_stored(symbol, interval, limit)
+    last = int(head['open_time'].iloc[-1])
+    if (time.time() * 1000 - last) // INTERVAL_MS[interval] >= limit:
+        return fetch_klines_stored(symbol, interval, limit)
+
+    tail = compact_klines(fetch_klines_range(symbol, interval, last))
+    combined = pd.concat([head, tail])
+    combined = combined[~combined.index.duplicated(keep='last')]
+    return combined.iloc[-limit:]
+
+
+def snapshot_derived(symbol, interval, limit, df, source=None):
+    """
+    快照之後新增的K線不超過 limit 的 REUSE_FRACTION 時，以快照的價格分布組成衍生統計
+    （波動率部分計算量小，仍以最新數據計算）；不適用時返回 None
+    """
+    source = source or SNAPSHOTS
+    shard = source.shard(symbol) if source is not None else None
+    snapshot = shard.distribution(interval, limit) if shard is not None else None
+    if snapshot is None or df.empty:
+        return None
+    last_open_time, distribution = snapshot
+    new_candles = (int(df['open_time'].iloc[-1]) - last_open_time) // INTERVAL_MS[interval]
+    if new_candles < 0 or new_candles > max(1, int(limit * REUSE_FRACTION)):
+        return None
+    return summarize(df, interval, distribution=distribution)
@@ -0,0 +1,509 @@
+"""
+逐筆成交的價量分布 (volume-at-price)
+
+    # 以 API 建立最近 7 天的每日分布緩存
+    python volume_profile.py BTCUSDT --days 7 --cache data/volume_profile
+    # 以 data.binance.vision 的 aggTrades 存檔建立（日檔或月檔）
+    python volume_profile.py BTCUSDT --archives ./downloads --cache data/volume_profile
+
+成交量按實際成交價累加到固定寬度的價格箱，並區分主動買入 / 主動賣出。
+/api/v3/aggTrades 以成交 ID 分頁串流（每頁 1000 筆），每頁處理後即丟棄，
+記憶體只與價格箱數量有關，與成交筆數無關。已結束的 UTC 日以每日分布緩存，
+未結束的當日保存部分分布與下一個成交 ID，之後只抓取新的成交；任意時間範圍由每日分布合併而成。設定 CRYMAP_VOLUME_PROFILE 後 app 也會讀取同一份緩存。
+"""
+import argparse
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from market_data import get_json
+
+DAY_MS = 24 * 60 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+PAGE_LIMIT = 1000
+AGG_TRADE_COLUMNS = ['agg_trade_id', 'price', 'quantity', 'first_trade_id', 'last_trade_id',
+                     'transact_time', 'is_buyer_maker', 'is_best_match']
+ARCHIVE_NAME = re.compile(r'^(?P<symbol>[A-Z0-9]+)-aggTrades-\d{4}-\d{2}(-\d{2})?\.zip$')
+CHUNK_ROWS = 500_000
+# 2025 年起的現貨存檔時間戳為微秒
+MICROSECOND_THRESHOLD = 10 ** 14
+
+
+def default_bin_size(price):
+    """價格箱寬度：價格數量級的萬分之一（10 的整數次方，不同寬度之間可無損合併到較寬者）"""
+    return 10.0 ** (np.floor(np.log10(price)) - 4)
+
+
+class PriceHistogram:
+    """
+    稀疏的價格箱成交量：bins 為遞增的箱編號（價格 // bin_size），
+    buy / sell 為主動買入 / 主動賣出的成交量（基礎資產數量）
+    """
+
+    def __init__(self, bin_size, bins=None, buy=None, sell=None, trades=0):
+        self.bin_size = float(bin_size)
+        self.bins = np.empty(0, dtype=np.int64) if bins is None else np.asarray(bins, dtype=np.int64)
+        self.buy = np.empty(0) if buy is None else np.asarray(buy, dtype=np.float64)
+        self.sell = np.empty(0) if sell is None else np.asarray(sell, dtype=np.float64)
+        self.trades = trades
+
+    def _combine(self, bins, buy, sell):
+        keys, inverse = np.unique(np.concatenate([self.bins, bins]), return_inverse=True)
+        self.buy = np.bincount(inverse, weights=np.concatenate([self.buy, buy]), minlength=len(keys))
+        self.sell = np.bincount(inverse, weights=np.concatenate([self.sell, sell]), minlength=len(keys))
+        self.bins = keys
+
+    def add(self, prices, quantities, buyer_is_maker):
+        """累加一批成交；buyer_is_maker 為 True 表示主動賣出"""
+        bins = np.floor(prices / self.bin_size + 1e-9).astype(np.int64)
+        sold = quantities * buyer_is_maker
+        self._combine(bins, quantities - sold, sold)
+        self.trades += len(prices)
+
+    def rebinned(self, bin_size):
+        """轉換到更寬（整數倍）的箱寬"""
+        factor = int(round(bin_size / self.bin_size))
+        if factor <= 1:
+            return self
+        out = PriceHistogram(bin_size, trades=self.trades)
+        out._combine(self.bins // factor, self.buy, self.sell)
+        return out
+
+    def merge(self, other):
+        """合併另一個分布（箱寬不同時都轉到較寬者），返回新物件"""
+        bin_size = max(self.bin_size, other.bin_size)
+        out = self.rebinned(bin_size)
+        out = PriceHistogram(bin_size, out.bins, out.buy, out.sell, out.trades)
+        other = other.rebinned(bin_size)
+        out._combine(other.bins, other.buy, other.sell)
+        out.trades += other.trades
+        return out
+
+    @property
+    def prices(self):
+        """各箱的中心價格"""
+        return (self.bins + 0.5) * self.bin_size
+
+    def to_grid(self, grid):
+        """重新分箱到等距網格（例如 KDE 的 x_vals），返回 (buy, sell)"""
+        if len(grid) < 2 or len(self.bins) == 0:
+            return np.zeros(len(grid)), np.zeros(len(grid))
+        step = (grid[-1] - grid[0]) / (len(grid) - 1)
+        idx = np.floor((self.prices - grid[0]) / step + 0.5).astype(np.int64)
+        inside = (idx >= 0) & (idx < len(grid))
+        return (np.bincount(idx[inside], weights=self.buy[inside], minlength=len(grid)),
+                np.bincount(idx[inside], weights=self.sell[inside], minlength=len(grid)))
+
+
+# === 每日分布緩存 ===
+class VolumeProfileStore:
+    """
+    已結束 UTC 日的價量分布緩存，以及尚未串流完成的日（通常是當日）的部分分布與接續的成交 ID；
+    另記錄已結束日的成交 ID 範圍，免得每次規劃都重新定位
+    root 為目錄時寫入 {root}/{symbol}/{日期}.npz（部分分布為 {日期}.partial.npz，ID 範圍為 {日期}.ids.npy），
+    否則只保存在進程內（各最多 max_memory_days 個）
+    """
+
+    def __init__(self, root=None, max_memory_days=512):
+        self.root = root
+        self.max_memory_days = max_memory_days
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._partial = OrderedDict()
+        self._ids = OrderedDict()
+
+    def _path(self, symbol, day_ms, suffix=".npz"):
+        day = time.strftime('%Y-%m-%d', time.gmtime(day_ms / 1000))
+        return os.path.join(self.root, symbol, f"{day}{suffix}")
+
+    def _load(self, path):
+        try:
+            with np.load(path) as f:
+                hist = PriceHistogram(float(f['bin_size']), f['bins'], f['buy'], f['sell'], int(f['trades']))
+                return hist, (int(f['next_id']) if 'next_id' in f.files else None)
+        except FileNotFoundError:
+            return None, None
+
+    def _save(self, path, hist, **extra):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, bin_size=hist.bin_size, bins=hist.bins, buy=hist.buy, sell=hist.sell, trades=hist.trades,
+                 **extra)
+        os.replace(tmp, path)
+
+    def get(self, symbol, day_ms):
+        with self._lock:
+            hist = self._memory.get((symbol, day_ms))
+            if hist is not None:
+                self._memory.move_to_end((symbol, day_ms))
+                return hist
+        if self.root is None:
+            return None
+        hist, _ = self._load(self._path(symbol, day_ms))
+        if hist is not None:
+            self._remember(self._memory, (symbol, day_ms), hist)
+        return hist
+
+    def put(self, symbol, day_ms, hist):
+        """寫入已完成的日（同時刪除其部分分布）"""
+        if self.root is not None:
+            self._save(self._path(symbol, day_ms), hist)
+        self._remember(self._memory, (symbol, day_ms), hist)
+        self.drop_partial(symbol, day_ms)
+
+    def get_partial(self, symbol, day_ms):
+        """返回 (部分分布, 接續的成交 ID)，沒有時返回 None"""
+        with self._lock:
+            partial = self._partial.get((symbol, day_ms))
+        if partial is not None or self.root is None:
+            return partial
+        hist, next_id = self._load(self._path(symbol, day_ms, ".partial.npz"))
+        if hist is None or next_id is None:
+            return None
+        partial = (hist, next_id)
+        self._remember(self._partial, (symbol, day_ms), partial)
+        return partial
+
+    def put_partial(self, symbol, day_ms, hist, next_id):
+        """記錄已累加到 next_id 之前（不含）的部分分布"""
+        if self.root is not None:
+            self._save(self._path(symbol, day_ms, ".partial.npz"), hist, next_id=next_id)
+        self._remember(self._partial, (symbol, day_ms), (hist, next_id))
+
+    def drop_partial(self, symbol, day_ms):
+        with self._lock:
+            self._partial.pop((symbol, day_ms), None)
+        if self.root is not None:
+            try:
+                os.remove(self._path(symbol, day_ms, ".partial.npz"))
+            except FileNotFoundError:
+                pass
+
+    def get_id_range(self, symbol, day_ms):
+        """已結束日的成交 ID 範圍 (first, last)，first == last 表示當日無成交；未記錄時返回 None"""
+        with self._lock:
+            id_range = self._ids.get((symbol, day_ms))
+        if id_range is not None or self.root is None:
+            return id_range
+        try:
+            id_range = tuple(int(i) for i in np.load(self._path(symbol, day_ms, ".ids.npy")))
+        except FileNotFoundError:
+            return None
+        self._remember(self._ids, (symbol, day_ms), id_range)
+        return id_range
+
+    def put_id_range(self, symbol, day_ms, id_range):
+        """記錄已結束日的成交 ID 範圍（id_range 為 None 表示當日無成交）"""
+        id_range = (0, 0) if id_range is None else (int(id_range[0]), int(id_range[1]))
+        if self.root is not None:
+            path = self._path(symbol, day_ms, ".ids.npy")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp, np.array(id_range, dtype=np.int64))
+            os.replace(tmp, path)
+        self._remember(self._ids, (symbol, day_ms), id_range)
+
+    def _remember(self, memory, key, value):
+        with self._lock:
+            memory[key] = value
+            memory.move_to_end(key)
+            while len(memory) > self.max_memory_days:
+                memory.popitem(last=False)
+
+
+VOLUME_PROFILE_STORE = VolumeProfileStore(os.environ.get('CRYMAP_VOLUME_PROFILE'))
+
+
+# === aggTrades 串流 ===
+class PageBudgetExceeded(ValueError):
+    """缺少的逐筆成交需要的請求數超過上限（與 API 錯誤區分，調用方可改為提示建立緩存）"""
+
+
+def fetch_agg_trades(symbol, params, timeout=10):
+    """返回 (ids, prices, quantities, times, buyer_is_maker) 陣列，API 返回錯誤時拋出 ValueError"""
+    data = get_json("aggTrades", {'symbol': symbol, 'limit': PAGE_LIMIT, **params}, timeout)
+    if not isinstance(data, list):
+        raise ValueError(f"API 返回錯誤: {data}")
+    return (np.array([t['a'] for t in data], dtype=np.int64),
+            np.array([t['p'] for t in data], dtype=np.float64),
+            np.array([t['q'] for t in data], dtype=np.float64),
+            np.array([t['T'] for t in data], dtype=np.int64),
+            np.array([t['m'] for t in data], dtype=bool))
+
+
+def trade_id_at(symbol, time_ms, until_ms=None, max_requests=None):
+    """
+    time_ms 當時或之後的第一筆成交 ID（API 的時間窗最長 1 小時，逐小時往後找）
+    返回 (ID 或 None, 請求次數)；超過 max_requests 次仍未找到時拋出 PageBudgetExceeded
+    """
+    until_ms = time.time() * 1000 if until_ms is None else until_ms
+    start, requests = time_ms, 0
+    while start < until_ms:
+        if max_requests is not None and requests >= max_requests:
+            raise PageBudgetExceeded(f"{symbol} 定位成交 ID 超過 {max_requests} 次請求")
+        ids = fetch_agg_trades(symbol, {'startTime': int(start), 'endTime': int(min(start + HOUR_MS, until_ms)) - 1,
+                                        'limit': 1})[0]
+        requests += 1
+        if len(ids):
+            return int(ids[0]), requests
+        start += HOUR_MS
+    return None, requests
+
+
+def day_end_id(symbol, day_ms, max_requests=None):
+    """UTC 日結束後的第一筆成交 ID（當日尚未結束或之後再無成交時為目前最新一筆 + 1），返回 (ID, 請求次數)"""
+    last, requests = None, 0
+    if day_ms + DAY_MS < time.time() * 1000:
+        last, requests = trade_id_at(symbol, day_ms + DAY_MS, max_requests=max_requests)
+    if last is None:
+        last = int(fetch_agg_trades(symbol, {'limit': 1})[0][-1]) + 1
+        requests += 1
+    return last, requests
+
+
+def day_id_range(symbol, day_ms, max_requests=None):
+    """一個 UTC 日內的成交 ID 範圍 [first, last)（當日無成交時為 None），返回 (範圍, 請求次數)"""
+    now_ms = time.time() * 1000
+    first, requests = trade_id_at(symbol, day_ms, min(day_ms + DAY_MS, now_ms), max_requests)
+    if first is None:
+        return None, requests
+    last, more = day_end_id(symbol, day_ms, None if max_requests is None else max_requests - requests)
+    return (first, last), requests + more
+
+
+def stream_histogram(symbol, first_id, last_id, bin_size, end_ms=None, max_pages=None, hist=None):
+    """
+    以成交 ID 分頁串流 [first_id, last_id) 的成交並累加到 hist（預設為新的分布），記憶體與成交筆數無關
+    最多請求 max_pages 頁；返回 (分布, 下一個尚未累加的成交 ID, 請求次數)
+    """
+    hist = PriceHistogram(bin_size) if hist is None else hist
+    cursor, pages = first_id, 0
+    while cursor < last_id and (max_pages is None or pages < max_pages):
+        ids, prices, qty, times, maker = fetch_agg_trades(symbol, {'fromId': cursor})
+        pages += 1
+        if len(ids) == 0:
+            break
+        keep = ids < last_id
+        if end_ms is not None:
+            keep &= times < end_ms
+        hist.add(prices[keep], qty[keep], maker[keep])
+        cursor = min(int(ids[-1]) + 1, last_id)
+    return hist, cursor, pages
+
+
+def day_range(start_ms, end_ms):
+    """涵蓋 [start_ms, end_ms) 的 UTC 日起點"""
+    return list(range(int(start_ms) // DAY_MS * DAY_MS, int(end_ms), DAY_MS))
+
+
+def plan_days(symbol, start_ms, end_ms=None, store=None, max_pages=None, cached_only=False):
+    """
+    返回 [(日起點, 緩存的分布或 None, 待串流的成交 ID 範圍或 None, 部分分布或 None)] 與規劃用掉的請求數
+    已結束且已緩存的日不需要請求；有部分分布的日（例如當日）從記錄的成交 ID 接續，只規劃真正缺少的部分；
+    已結束日的成交 ID 範圍定位後記錄在 store，之後不再請求
+    cached_only 時略過沒有緩存也沒有部分分布的已結束日（互動介面用：只計入緩存與當日）
+    在發出任何請求前先估算定位成交 ID 至少需要的請求數，與規劃過程中超過 max_pages 時都拋出 PageBudgetExceeded
+    """
+    store = store or VOLUME_PROFILE_STORE
+    now_ms = time.time() * 1000
+    end_ms = now_ms if end_ms is None else end_ms
+    entries = []
+    for day in day_range(start_ms, end_ms):
+        closed = day + DAY_MS <= now_ms
+        cached = store.get(symbol, day) if day + DAY_MS <= end_ms else None
+        partial = store.get_partial(symbol, day) if cached is None else None
+        memo = store.get_id_range(symbol, day) if cached is None and closed else None
+        if cached is None and partial is None and memo is None and closed and cached_only:
+            continue
+        entries.append((day, closed, cached, partial, memo))
+
+    # 每個需要定位的日至少 2 次請求（日起點、日結束的成交 ID），有部分分布的日至少 1 次
+    if max_pages is not None:
+        minimum = sum(2 if partial is None else 1 for _, _, cached, partial, memo in entries
+                      if cached is None and memo is None)
+        if minimum > max_pages:
+            raise PageBudgetExceeded(f"{symbol} 缺少的逐筆成交至少需要 {minimum} 次請求（上限 {max_pages}）")
+
+    plan, requests = [], 0
+    # 從最近的日往回規劃，超出預算時盡早停止
+    for day, closed, cached, partial, memo in reversed(entries):
+        id_range = None
+        if cached is None:
+            remaining = None if max_pages is None else max_pages - requests
+            if memo is not None:
+                id_range, used = (memo if memo[1] > memo[0] else None), 0
+            elif partial is not None:
+                last, used = day_end_id(symbol, day, remaining)
+                id_range = (partial[1], last)
+                if closed:
+                    store.put_id_range(symbol, day, id_range)
+            else:
+                if remaining is not None and remaining < 2:
+                    raise PageBudgetExceeded(f"{symbol} 缺少的逐筆成交至少需要 {requests + 2} 次請求（上限 {max_pages}）")
+                id_range, used = day_id_range(symbol, day, remaining)
+                if closed:
+                    store.put_id_range(symbol, day, id_range)
+            if partial is not None:
+                # 部分分布已累加到 partial[1]，只需接續其後的成交
+                id_range = (partial[1], id_range[1]) if id_range is not None and id_range[1] > partial[1] else None
+            requests += used
+        plan.append((day, cached, id_range, partial))
+    return plan[::-1], requests
+
+
+def uncached_days(symbol, start_ms, end_ms=None, store=None):
+    """cached_only 時被略過的已結束日（沒有緩存、也沒有部分分布）"""
+    store = store or VOLUME_PROFILE_STORE
+    now_ms = time.time() * 1000
+    end_ms = now_ms if end_ms is None else min(end_ms, now_ms)
+    return [day for day in day_range(start_ms, end_ms) if day + DAY_MS <= now_ms
+            and store.get(symbol, day) is None and store.get_partial(symbol, day) is None]
+
+
+def estimate_pages(plan):
+    """串流計劃中待抓取的成交所需的頁數"""
+    return sum(-(-(id_range[1] - id_range[0]) // PAGE_LIMIT) for _, _, id_range, _ in plan if id_range is not None)
+
+
+def volume_at_price(symbol, start_ms, end_ms=None, bin_size=None, store=None, max_pages=None, cached_only=False):
+    """
+    [start_ms, end_ms) 所在各 UTC 日的價量分布（以整日為單位合併）
+    已結束的日從緩存讀取或計算後寫入緩存；未結束的當日累加到目前為止的部分分布並記錄接續的成交 ID，
+    之後只抓取新的成交
+    缺少的成交超過 max_pages 次請求時拋出 PageBudgetExceeded（可改用存檔建立緩存），API 錯誤時拋出 ValueError；
+    只差當日的成交時仍以預算內的請求串流並保存進度，之後重試會接續
+    cached_only 時只合併已緩存的日、有部分進度的日與當日（見 plan_days），不抓取其餘已結束的日
+    """
+    store = store or VOLUME_PROFILE_STORE
+    now_ms = time.time() * 1000
+    end_ms = now_ms if end_ms is None else min(end_ms, now_ms)
+    plan, requests = plan_days(symbol, start_ms, end_ms, store, max_pages, cached_only)
+    remaining = None if max_pages is None else max_pages - requests
+    if remaining is not None:
+        pages = estimate_pages(plan)
+        # 已結束的日沒有部分進度可用時一次需要全部抓取，超出預算就不開始（有部分進度的日可分次接續）
+        closed_pages = estimate_pages([entry for entry in plan if entry[0] + DAY_MS <= now_ms and entry[3] is None])
+        if closed_pages > remaining:
+            raise PageBudgetExceeded(f"{symbol} 缺少的逐筆成交需要約 {requests + pages} 次請求（上限 {max_pages}）")
+    if bin_size is None:
+        # 沿用已緩存日的箱寬，避免合併時被迫轉到較寬的箱
+        bin_size = next((hist.bin_size for _, cached, _, partial in plan
+                         for hist in (cached, partial and partial[0]) if hist), None)
+    total = None
+    incomplete = False
+    for day, cached, id_range, partial in plan:
+        hist = cached
+        if hist is None:
+            if partial is not None:
+                # 複製一份再累加，不修改緩存中共用的物件
+                base = partial[0]
+                hist = PriceHistogram(base.bin_size, base.bins, base.buy, base.sell, base.trades)
+            if id_range is not None:
+                if bin_size is None:
+                    price = fetch_agg_trades(symbol, {'fromId': id_range[0], 'limit': 1})[1]
+                    bin_size = default_bin_size(price[0]) if len(price) else 1.0
+                hist, next_id, used = stream_histogram(symbol, id_range[0], id_range[1], bin_size,
+                                                       end_ms=day + DAY_MS, max_pages=remaining, hist=hist)
+                if remaining is not None:
+                    remaining -= used
+                if day + DAY_MS <= now_ms and next_id >= id_range[1]:
+                    store.put(symbol, day, hist)
+                else:
+                    store.put_partial(symbol, day, hist, next_id)
+                    incomplete |= next_id < id_range[1]
+            elif hist is not None and day + DAY_MS <= now_ms:
+                store.put(symbol, day, hist)
+            if hist is None:
+                continue
+        total = hist if total is None else total.merge(hist)
+    if incomplete:
+        raise PageBudgetExceeded(f"{symbol} 未完成的逐筆成交超過 {max_pages} 次請求，已保存目前進度，稍後重試會接續")
+    return total
+
+
+# === 存檔匯入 ===
+def import_agg_trade_archive(path, symbol, bin_size=None, store=None, chunk_rows=CHUNK_ROWS):
+    """
+    串流解析一個 aggTrades 存檔（日檔或月檔），按 UTC 日累加後寫入緩存
+    返回 (成交筆數, 使用的箱寬)
+    """
+    store = store or VOLUME_PROFILE_STORE
+    days = {}
+    count = 0
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if not member.endswith('.csv'):
+                continue
+            with zf.open(member) as stream:
+                has_header = not stream.peek(1)[:1].isdigit()
+                reader = pd.read_csv(stream, header=None, names=AGG_TRADE_COLUMNS,
+                                     usecols=['price', 'quantity', 'transact_time', 'is_buyer_maker'],
+                                     skiprows=1 if has_header else 0, chunksize=chunk_rows)
+                for chunk in reader:
+                    prices = chunk['price'].to_numpy(dtype=np.float64)
+                    qty = chunk['quantity'].to_numpy(dtype=np.float64)
+                    times = chunk['transact_time'].to_numpy(dtype=np.int64)
+                    times = np.where(times >= MICROSECOND_THRESHOLD, times // 1000, times)
+                    maker = chunk['is_buyer_maker'].astype(str).str.lower().eq('true').to_numpy()
+                    if bin_size is None and len(prices):
+                        bin_size = default_bin_size(prices[0])
+                    day_of = times // DAY_MS * DAY_MS
+                    for day in np.unique(day_of):
+                        sel = day_of == day
+                        hist = days.setdefault(int(day), PriceHistogram(bin_size))
+                        hist.add(prices[sel], qty[sel], maker[sel])
+                    count += len(prices)
+    for day, hist in days.items():
+        store.put(symbol, day, hist)
+    return count, bin_size
+
+
+def import_agg_trade_archives(directory, symbol, store=None):
+    """匯入目錄中該交易對的所有 aggTrades 存檔，返回 (文件數, 成交筆數)"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            match = ARCHIVE_NAME.match(name)
+            if match and match['symbol'] == symbol:
+                paths.append(os.path.join(root, name))
+    total = 0
+    bin_size = None
+    for path in sorted(paths):
+        # 同一交易對沿用第一個存檔的箱寬
+        count, bin_size = import_agg_trade_archive(path, symbol, bin_size, store)
+        total += count
+    return len(paths), total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="建立逐筆成交價量分布緩存")
+    parser.add_argument("symbol")
+    parser.add_argument("--days", type=int, default=7, help="以 API 建立最近幾天（含今日）")
+    parser.add_argument("--archives", help="改從此目錄的 aggTrades 存檔匯入")
+    parser.add_argument("--cache", default=os.environ.get('CRYMAP_VOLUME_PROFILE', 'data/volume_profile'),
+                        help="緩存目錄（預設為 CRYMAP_VOLUME_PROFILE 或 data/volume_profile）")
+    parser.add_argument("--top", type=int, default=10, help="列出成交量最大的價格箱數量")
+    args = parser.parse_args()
+
+    symbol = args.symbol.upper()
+    store = VolumeProfileStore(args.cache)
+    t0 = time.time()
+    if args.archives:
+        files, trades = import_agg_trade_archives(args.archives, symbol, store)
+        print(f"{symbol}: 匯入 {files} 個存檔，{trades:,} 筆成交，耗時 {time.time() - t0:.1f} 秒")
+    else:
+        now_ms = time.time() * 1000
+        hist = volume_at_price(symbol, now_ms - (args.days - 1) * DAY_MS, store=store)
+        if hist is None:
+            print(f"{symbol}: 沒有成交")
+        else:
+            print(f"{symbol}: {hist.trades:,} 筆成交，{len(hist.bins)} 個價格箱 (寬 {hist.bin_size:g})，"
+                  f"耗時 {time.time() - t0:.1f} 秒")
+            total = hist.buy + hist.sell
+            for i in np.argsort(total)[::-1][:args.top]:
+                print(f"  {hist.prices[i]:.6f}: 成交 {total[i]:.4f} (買 {hist.buy[i]:.4f} / 賣 {hist.sell[i]:.4f})")
@@ -1,4 +1,5 @@
-import requests
+import os
+import sys
 import pandas as pd
 import numpy as np
 import streamlit as st
@@ -8,7 +9,12 @@ from scipy.stats import norm, gaussian_kde
 from scipy.signal import argrelextrema
 from datetime import datetime, timedelta
 import json
-import time
+
+# 共用 src/ 下的數據模組（與 app.py 相同的本地緩存與存檔）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from coingecko import coingecko_request, fetch_coingecko_stored
+from kline_cache import load_klines
+
 st.set_page_config(layout="wide")
 st.title("📊 加密貨幣價格波動與價值分布分析工具")
 
@@ -35,26 +41,20 @@ days = st.sidebar.selectbox("選擇觀察天數", options, index=options.index(1
 coin_id = coin_name_map[selected_coin]
 
 
-# === Step 1: 抓取歷史資料（每15分鐘） ===
-url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
-params = {
-    'vs_currency': 'usd',
-    'days': str(days),
-    #'interval': '15m'
-}
-resp = requests.get(url, params=params)
-data = resp.json()
-time.sleep(2.5)
-if 'prices' not in data:
-    st.error("❌ 無法取得資料，請確認幣種是否支援。")
+# === Step 1: 抓取歷史資料（CoinGecko，經本地緩存 / 存檔並限流） ===
+symbol, interval, limit = coingecko_request(coin_id, days)
+try:
+    # record=False：不計入 Binance 預取的熱門交易對統計
+    entry = load_klines(symbol, interval, limit, record=False, fetch=fetch_coingecko_stored)
+except Exception as e:
+    st.error(f"❌ 無法取得資料，請確認幣種是否支援。({e})")
     st.stop()
 
-# 整理 DataFrame
-df = pd.DataFrame(data['prices'], columns=['timestamp', 'price'])
-df['date'] = pd.to_datetime(df['timestamp'], unit='ms')
-df.set_index('date', inplace=True)
-df.drop(columns=['timestamp'], inplace=True)
-df['volume'] = [v[1] for v in data['total_volumes']]
+# 價格與成交量已按時間戳對齊
+df = entry['df'][['close', 'volume']].rename(columns={'close': 'price'})
+if df.empty:
+    st.error("❌ 無法取得資料，請確認幣種是否支援。")
+    st.stop()
 
 st.subheader(f"📉 {coin_id} 最新價格")
 latest_price = df['price'].iloc[-1]
@@ -102,16 +102,18 @@ fig2.add_trace(go.Scatter(x=x_vals, y=kde_vals, fill='tozeroy', mode='lines',
                           line_color='orange', name='KDE Weighted'))
 fig2.add_vline(x=prices.iloc[-1], line_dash="dash", line_color="white", annotation_text=f"  Today Price: {prices.iloc[-1]:.5f}", annotation_position="bottom right")
 
-for p in peaks:
-    fig2.add_vline(x=x_vals[p], line_dash="dot", line_color="blue")
-    fig2.add_annotation(x=x_vals[p], y=kde_vals[p], text=f"核心: {x_vals[p]:.5f}", showarrow=True, arrowhead=1)
-for t in troughs:
-    fig2.add_vline(x=x_vals[t], line_dash="dot", line_color="gray")
-    fig2.add_annotation(x=x_vals[t], y=kde_vals[t], text=f"錨點: {x_vals[t]:.5f}", showarrow=True, arrowhead=1)
+# 峰值與谷值的參考線、標註一次性寫入 layout（逐條 add_vline 會隨數量線性重複驗證整個 layout）
+level_shapes = [dict(type="line", xref="x", yref="paper", x0=x_vals[i], x1=x_vals[i], y0=0, y1=1,
+                     line=dict(color=color, dash="dot"))
+                for idx, color in ((peaks, "blue"), (troughs, "gray")) for i in idx]
+level_annotations = [dict(x=x_vals[i], y=kde_vals[i], text=f"{label}: {x_vals[i]:.5f}", showarrow=True, arrowhead=1)
+                     for idx, label in ((peaks, "核心"), (troughs, "錨點")) for i in idx]
 
 fig2.update_layout(height=400, margin=dict(l=20, r=20, t=30, b=20),
                   xaxis_title="Price (USD)", yaxis_title="Weighted Density",
-                  template="plotly_white")
+                  template="plotly_white",
+                  shapes=list(fig2.layout.shapes) + level_shapes,
+                  annotations=list(fig2.layout.annotations) + level_annotations)
 
 
 # === Step 5: 統計摘要 ===